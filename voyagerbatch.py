@@ -0,0 +1,303 @@
+"""
+** voyagerbatch.py - Headless batch decoder of the Voyager Golden Disk images **
+
+Copyright (c) <2017> Manuel Arturo Izquierdo <aizquier@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import sys
+import json
+import argparse
+import collections
+from concurrent.futures import ProcessPoolExecutor
+
+from voyagercore import load_wav, get_segment, align_segment, frame_offsets, frame_index, to_image, FrameWriter, \
+    color_frame, to_color_image, ALIGN_MODES, INTERPOLATIONS, NORMALIZATIONS
+
+CHANNELS = {"left": 0, "right": 1, "both": None}
+
+# * audio data opened by the current (worker) process, keyed by filename. Workers
+# * map the files themselves, so no samples are ever pickled between processes.
+_opened = {}
+
+
+def open_audio(filename):
+    if filename not in _opened:
+        _opened[filename] = load_wav(filename)[1]
+    return _opened[filename]
+
+
+def decode_frame(job):
+    filename, offset, options = job[:3]
+    arguments = (
+        open_audio(filename),
+        offset,
+        options.scan_line_width,
+        options.number_of_scans,
+        options.adjust,
+        options.invert,
+        CHANNELS[options.channel]
+    )
+    if options.align is None:
+        image_data, _ = get_segment(*arguments, interpolation=options.interpolation)
+    else:
+        image_data, _, _ = align_segment(*arguments, mode=options.align)
+    if options.flip:
+        image_data = image_data[:, ::-1]
+    return image_data
+
+
+def export_frame(job):
+    output, options = job[3], job[2]
+    to_image(decode_frame(job), options.resize, options.normalize, options.bits).save(output)
+    return output
+
+
+def export_color_frame(job):
+    filename, offsets, options, output = job
+    rgb, _ = color_frame(open_audio(filename), offsets[0], options.scan_line_width, options.number_of_scans,
+                         options.adjust, options.invert, CHANNELS[options.channel], options.interpolation,
+                         frame_offsets=offsets, order=options.color)
+    if options.flip:
+        rgb = rgb[:, ::-1]
+    to_color_image(rgb, options.resize, options.normalize).save(output)
+    return output
+
+
+def find_offsets(job):
+    '''Offsets of the frames to decode for a (wav, options) pair: consecutive frames or the frame index.
+
+    For color images every item is the tuple of the offsets of the three
+    frames merged into one image.
+    '''
+    filename, options = job
+    audio_data = open_audio(filename)
+    if options.index:
+        offsets = [offset for offset in frame_index(filename, audio_data, options.scan_line_width,
+                                                    options.number_of_scans, options.adjust,
+                                                    CHANNELS[options.channel])
+                   if offset >= options.offset]
+    else:
+        offsets = frame_offsets(len(audio_data), options.offset,
+                                options.scan_line_width, options.number_of_scans, options.adjust)
+    if options.color is not None:
+        # * each color image takes three frames; drop an incomplete last group
+        offsets = [tuple(offsets[n:n + 3]) for n in range(0, len(offsets) - 2, 3)]
+    offsets = offsets[options.first:]
+    if options.count is not None:
+        offsets = offsets[:options.count]
+    return offsets
+
+
+# * manifest keys that are not decoding options, and short names of options
+MANIFEST_KEYS = ("wav", "channels")
+# * per file options of a manifest: manifest name -> (option, type, choices)
+MANIFEST_OPTIONS = {
+    "slw": ("scan_line_width", int, None),
+    "nos": ("number_of_scans", int, None),
+    "adjust": ("adjust", float, None),
+    "offset": ("offset", int, None),
+    "first": ("first", int, None),
+    "count": ("count", int, None),
+    "index": ("index", bool, None),
+    "invert": ("invert", bool, None),
+    "flip": ("flip", bool, None),
+    "resize": ("resize", bool, None),
+    "align": ("align", str, ALIGN_MODES),
+    "interpolation": ("interpolation", str, INTERPOLATIONS),
+    "normalize": ("normalize", str, NORMALIZATIONS),
+    "bits": ("bits", int, (8, 16))
+}
+# * options that may be null in a manifest, as they are when not given on the command line
+MANIFEST_NULLABLE = ("count", "align")
+
+
+def manifest_option(filename, key, value):
+    '''Checks one per file option of a manifest, returns its (option, value).'''
+    if key not in MANIFEST_OPTIONS:
+        raise ValueError("%s: option %r can not be set in a manifest" % (filename, key))
+    name, kind, choices = MANIFEST_OPTIONS[key]
+    if value is None and key in MANIFEST_NULLABLE:
+        return name, value
+    # * JSON booleans are ints to Python, and ints are valid floats
+    if kind is bool:
+        valid = isinstance(value, bool)
+    elif kind is float:
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+    else:
+        valid = isinstance(value, kind) and not isinstance(value, bool)
+    if not valid:
+        raise ValueError("%s: option %r must be of type %s, not %r" % (filename, key, kind.__name__, value))
+    if choices is not None and value not in choices:
+        raise ValueError("%s: option %r must be one of %s, not %r" % (
+            filename, key, ", ".join(str(choice) for choice in choices), value))
+    return name, kind(value)
+
+
+def read_manifest(filename, options):
+    '''Reads a JSON manifest, returns a list of (wav, options) pairs, one per file and channel.
+
+    The manifest holds an optional "defaults" object and a "files" list.
+    Every file has a "wav" path (relative to the manifest) and may override
+    the options in MANIFEST_OPTIONS, with the names of the command line
+    options (e.g. "slw", "adjust", "offset", "first", "count", "index").
+    "channels" lists the channels to decode, e.g. ["left", "right"]. The
+    options that apply to the whole job (output, format, color, stack, jobs)
+    are only taken from the command line.
+    '''
+    with open(filename) as f:
+        manifest = json.load(f)
+    base = os.path.dirname(os.path.abspath(filename))
+    defaults = manifest.get("defaults", {})
+
+    entries = []
+    for entry in manifest["files"]:
+        settings = dict(vars(options))
+        for key, value in list(defaults.items()) + list(entry.items()):
+            if key in MANIFEST_KEYS:
+                continue
+            key, value = manifest_option(filename, key, value)
+            settings[key] = value
+        wav = os.path.join(base, entry["wav"])
+        if not os.path.isfile(wav) or not os.access(wav, os.R_OK):
+            raise ValueError("%s: %s is not a readable file" % (filename, wav))
+        channels = entry.get("channels", defaults.get("channels", [settings["channel"]]))
+        if not isinstance(channels, list):
+            raise ValueError("%s: channels must be a list, e.g. [\"left\", \"right\"], not %r" % (filename, channels))
+        for channel in channels:
+            if channel not in CHANNELS:
+                raise ValueError("%s: unknown channel %r" % (filename, channel))
+            settings["channel"] = channel
+            entries.append((wav, argparse.Namespace(**settings)))
+    return entries
+
+
+def ordered_map(executor, function, jobs, window):
+    '''Like executor.map, but with at most `window` jobs in flight, so results never pile up in memory.'''
+    pending = collections.deque()
+    for job in jobs:
+        pending.append(executor.submit(function, job))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Decodes every image of a Voyager Golden Disk .wav file without a display.")
+    parser.add_argument("wav", nargs="?", default=None, help="input .wav file")
+    parser.add_argument("--manifest", default=None,
+                        help="JSON file listing the .wav files, channels and frames to decode, instead of wav")
+    parser.add_argument("-o", "--output-dir", default=".", help="directory of the exported images")
+    parser.add_argument("--format", choices=["png", "tiff"], default="png", help="image file format")
+    parser.add_argument("--offset", type=int, default=0, help="offset of the first frame (samples)")
+    parser.add_argument("--first", type=int, default=0, help="number of the first frame to export")
+    parser.add_argument("--count", type=int, default=None, help="number of frames to export (default: all)")
+    parser.add_argument("--index", action="store_true",
+                        help="decode the frames found by the sync pulse index instead of consecutive frames")
+    parser.add_argument("--slw", dest="scan_line_width", type=int, default=3197, help="scan line width")
+    parser.add_argument("--nos", dest="number_of_scans", type=int, default=512, help="number of scans per image")
+    parser.add_argument("--adjust", type=float, default=0.0, help="offset adjust per scan line")
+    parser.add_argument("--channel", choices=sorted(CHANNELS), default="left", help="channel of stereo files")
+    parser.add_argument("--align", choices=ALIGN_MODES, default=None,
+                        help="align every scan line to the first sync pulse or to the previous line")
+    parser.add_argument("--interpolation", choices=INTERPOLATIONS, default="nearest",
+                        help="resampling of the scan lines at their fractional offsets")
+    parser.add_argument("--invert", action="store_true", help="invert the audio signal")
+    parser.add_argument("--flip", action="store_true", help="flip the images horizontally")
+    parser.add_argument("--resize", action="store_true", help="resize the images to a 3:4 ratio")
+    parser.add_argument("--normalize", choices=NORMALIZATIONS, default="minmax",
+                        help="mapping of the samples to gray levels (default: minmax)")
+    parser.add_argument("--bits", type=int, choices=[8, 16], default=8, help="bits per pixel (16: png and tiff)")
+    parser.add_argument("--stack", metavar="TIFF", default=None,
+                        help="write all the frames as pages of a single TIFF file instead")
+    parser.add_argument("--color", metavar="ORDER", type=str.upper, default=None,
+                        help="merge every three consecutive frames, holding the colors in ORDER "
+                             "(e.g. RGB), into one aligned 8 bit color image")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="number of worker processes (0 uses all the cores)")
+    options = parser.parse_args(argv)
+    if (options.wav is None) == (options.manifest is None):
+        parser.error("give either a wav file or --manifest")
+    if options.color is not None:
+        if sorted(options.color) != ["B", "G", "R"]:
+            parser.error("--color must be a permutation of RGB")
+        if options.stack is not None:
+            parser.error("--color and --stack can not be used together")
+    return options
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    if options.manifest is None:
+        entries = [(options.wav, options)]
+    else:
+        try:
+            entries = read_manifest(options.manifest, options)
+        except (IOError, ValueError, KeyError) as error:
+            print("Invalid manifest: %s" % (error))
+            return 1
+
+    if not os.path.isdir(options.output_dir):
+        os.makedirs(options.output_dir)
+
+    # * stacks are written by this process, in order, as the workers decode the frames
+    function = export_frame if options.stack is None else decode_frame
+    if options.color is not None:
+        function = export_color_frame
+    writer = None if options.stack is None else FrameWriter(
+        options.stack, stack=True, resize=options.resize, method=options.normalize, bits=options.bits)
+
+    if options.jobs == 1:
+        executor = None
+        run = map
+    else:
+        jobs_count = options.jobs or os.cpu_count()
+        executor = ProcessPoolExecutor(max_workers=jobs_count)
+        run = lambda function, jobs: ordered_map(executor, function, jobs, 2 * jobs_count)
+
+    try:
+        # * files and channels are indexed in parallel too, then all their
+        # * frames go through the same pool
+        jobs = []
+        for (wav, entry_options), offsets in zip(entries, run(find_offsets, entries)):
+            stem = os.path.splitext(os.path.basename(wav))[0]
+            if options.manifest is not None:
+                stem += "_" + entry_options.channel
+            jobs.extend((wav, offset, entry_options,
+                         os.path.join(options.output_dir, "%s_%04d_%d.%s" % (
+                             stem, entry_options.first + n, offset[0] if options.color else offset, options.format)))
+                        for n, offset in enumerate(offsets))
+
+        for result, job in zip(run(function, jobs), jobs):
+            print(result if writer is None else "%s: %s offset %d" % (writer.write(result), job[0], job[1]))
+    finally:
+        if writer is not None:
+            writer.close()
+        if executor is not None:
+            executor.shutdown()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
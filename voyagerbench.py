@@ -0,0 +1,254 @@
+"""
+** voyagerbench.py - Benchmarks of the decoding, rendering and export paths of voyagerimb **
+
+Copyright (c) <2017> Manuel Arturo Izquierdo <aizquier@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import struct
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from voyagercore import load_wav, get_segment, align_segment, frame_offsets, normalize, to_image, \
+    minmax_decimate, split_period, INTERPOLATIONS
+
+
+def synthesize(filename, rate=48000, bits=16, channels=1, frames=8, line_period=3197.4, number_of_scans=512,
+               gap_lines=40, seed=0):
+    '''Writes a .wav file that looks like a side of the disk: frames of scan lines separated by gaps.
+
+    Every scan line starts with a short negative sync pulse followed by a
+    smooth random picture; the frames are `gap_lines` line periods apart.
+    The line period is fractional, like the one of the masters. Returns the
+    offset of the first frame.
+    '''
+    rng = np.random.RandomState(seed)
+    width = int(line_period)
+    pulse = max(int(0.02 * line_period), 1)
+    # * one picture, reused (slightly shifted) by every frame
+    picture = np.cumsum(np.cumsum(rng.standard_normal((number_of_scans, width)), axis=0), axis=1)
+    picture = 0.3 * picture / np.abs(picture).max()
+
+    gap = int(gap_lines * line_period)
+    frame_span = number_of_scans * line_period
+    length = int(gap + frames * (frame_span + gap))
+    signal = 0.01 * rng.standard_normal(length).astype(np.float32)
+    for n in range(frames):
+        start = gap + n * (frame_span + gap)
+        for k in range(number_of_scans):
+            line = int(start + k * line_period)
+            signal[line:line + pulse] = -0.8
+            signal[line + pulse:line + width] = np.roll(picture[k], n)[pulse:]
+
+    samples = np.repeat(signal[:, np.newaxis], channels, axis=1)
+    if channels > 1:
+        # * the other channels hold the inverted signal, as a stereo master could
+        samples[:, 1:] *= -1
+    write_wav(filename, samples, rate, bits)
+    return gap
+
+
+def write_wav(filename, samples, rate, bits):
+    '''Writes float samples in [-1, 1) as 8, 16, 24 bit PCM or 32 bit float (frames x channels).'''
+    channels = samples.shape[1]
+    if bits == 32:
+        format_tag, payload = 3, samples.astype('<f4').tobytes()
+    else:
+        levels = np.clip(np.round(samples * 2 ** (bits - 1)), -2 ** (bits - 1), 2 ** (bits - 1) - 1).astype(np.int32)
+        if bits == 8:
+            payload = (levels + 128).astype(np.uint8).tobytes()
+        elif bits == 16:
+            payload = levels.astype('<i2').tobytes()
+        else:
+            payload = levels.astype('<i4').view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+        format_tag = 1
+    block_align = channels * bits // 8
+    with open(filename, "wb") as f:
+        f.write(b"RIFF" + struct.pack("<I", 36 + len(payload)) + b"WAVE")
+        f.write(b"fmt " + struct.pack("<IHHIIHH", 16, format_tag, channels, rate, rate * block_align,
+                                      block_align, bits))
+        f.write(b"data" + struct.pack("<I", len(payload)))
+        f.write(payload)
+
+
+class Stage(object):
+    '''Timing of one benchmarked stage.'''
+
+    def __init__(self, name, frames, nbytes):
+        self.name = name
+        self.frames = frames
+        self.nbytes = nbytes
+        self.times = []
+        self.peak = 0
+
+    def run(self, function, repeat):
+        result = None
+        for _ in range(repeat):
+            tracemalloc.start()
+            start = time.perf_counter()
+            result = function()
+            self.times.append(time.perf_counter() - start)
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        return result
+
+    def report(self):
+        best = min(self.times)
+        return {
+            "stage": self.name,
+            "best_s": best,
+            "median_s": float(np.median(self.times)),
+            "frames_per_s": self.frames / best if self.frames else None,
+            "mb_per_s": self.nbytes / best / 1e6 if self.nbytes else None,
+            "peak_mb": self.peak / 1e6
+        }
+
+
+def render(figure, canvas, image_data, state):
+    '''Draws a frame as Imager.view_render does: persistent artists updated with set_data.'''
+    if "image" not in state:
+        ax1 = figure.add_subplot(2, 1, 1)
+        ax2 = figure.add_subplot(2, 1, 2)
+        state["image"] = ax1.imshow(image_data, aspect='auto', cmap='gray')
+        state["waveform"], = ax2.plot([], [])
+        ax2.set_ylim([-1.0, 1.0])
+        state["ax2"] = ax2
+    else:
+        state["image"].set_data(image_data)
+    state["image"].set_clim(image_data.min(), image_data.max())
+    x, y = minmax_decimate(image_data[len(image_data) // 2], state["ax2"].bbox.width)
+    state["waveform"].set_data(x, y)
+    state["ax2"].set_xlim([0, image_data.shape[1]])
+    canvas.draw()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Times loading, decoding, rescaling, rendering and export of synthetic Voyager recordings.")
+    parser.add_argument("--wav", default=None, help="benchmark this file instead of a synthetic one")
+    parser.add_argument("--rate", type=int, default=48000, help="sample rate of the synthetic file")
+    parser.add_argument("--bits", type=int, choices=[8, 16, 24, 32], default=16,
+                        help="bits per sample of the synthetic file (32: float)")
+    parser.add_argument("--channels", type=int, default=1, help="channels of the synthetic file")
+    parser.add_argument("--frames", type=int, default=8, help="frames of the synthetic file")
+    parser.add_argument("--period", type=float, default=3197.4, help="scan line period of the synthetic file")
+    parser.add_argument("--nos", dest="number_of_scans", type=int, default=512, help="number of scans per image")
+    parser.add_argument("--interpolation", choices=INTERPOLATIONS, default="nearest",
+                        help="resampling used by the decode stage")
+    parser.add_argument("--align", action="store_true", help="also time the sync alignment")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of every stage, the best one is reported")
+    parser.add_argument("--json", metavar="FILE", default=None, help="also write the results to FILE")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="voyagerbench")
+    filename = options.wav
+    offset = 0
+    if filename is None:
+        filename = os.path.join(workdir, "synthetic.wav")
+        offset = synthesize(filename, options.rate, options.bits, options.channels, options.frames,
+                            options.period, options.number_of_scans)
+    slw, adjust = split_period(options.period)
+    nos = options.number_of_scans
+
+    stages = []
+
+    def stage(name, function, frames=0, nbytes=0):
+        timing = Stage(name, frames, nbytes)
+        stages.append(timing)
+        return timing.run(function, options.repeat)
+
+    _, audio_data = stage("load", lambda: load_wav(filename), nbytes=os.path.getsize(filename))
+    offsets = frame_offsets(len(audio_data), offset, slw, nos, adjust)
+    if options.wav is None:
+        offsets = offsets[:options.frames]
+    frame_bytes = nos * slw * audio_data.nbytes // max(len(audio_data), 1)
+    count = len(offsets)
+    print("%s: %d frames of %d x %d, %.1f MB" % (filename, count, nos, slw, audio_data.nbytes / 1e6))
+    if not count:
+        print("No whole frame in the file")
+        return 1
+
+    def decode_all():
+        return [get_segment(audio_data, frame, slw, nos, adjust, interpolation=options.interpolation)[0]
+                for frame in offsets]
+    images = stage("decode (%s)" % (options.interpolation), decode_all, count, count * frame_bytes)
+
+    if options.align:
+        stage("decode (aligned to sync)",
+              lambda: [align_segment(audio_data, frame, slw, nos, adjust)[0] for frame in offsets],
+              count, count * frame_bytes)
+
+    stage("rescale", lambda: [normalize(image) for image in images], count, sum(image.nbytes for image in images))
+
+    figure = Figure(figsize=(8, 12), dpi=70)
+    canvas = FigureCanvasAgg(figure)
+    state = {}
+    stage("render (Agg)", lambda: [render(figure, canvas, image, state) for image in images], count)
+
+    def export_all():
+        for image in images:
+            buffer = io.BytesIO()
+            to_image(image, resize=True).save(buffer, format="PNG")
+    stage("export (png)", export_all, count)
+
+    results = [timing.report() for timing in stages]
+    print("%-26s %10s %10s %10s %10s" % ("stage", "best (s)", "frames/s", "MB/s", "peak MB"))
+    for result in results:
+        print("%-26s %10.4f %10s %10s %10.1f" % (
+            result["stage"], result["best_s"],
+            "-" if result["frames_per_s"] is None else "%.1f" % (result["frames_per_s"]),
+            "-" if result["mb_per_s"] is None else "%.1f" % (result["mb_per_s"]),
+            result["peak_mb"]))
+    try:
+        import resource
+        # * kilobytes on Linux, bytes on MacOS
+        scale = 1 if sys.platform.startswith('darwin') else 1024
+        print("peak resident memory: %.1f MB" % (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6))
+    except ImportError:
+        pass
+
+    if options.json is not None:
+        with open(options.json, "w") as f:
+            json.dump({"file": filename, "frames": count, "scan_line_width": slw, "number_of_scans": nos,
+                       "adjust": adjust, "stages": results}, f, indent=2)
+
+    if options.wav is None:
+        os.remove(filename)
+    os.rmdir(workdir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1183 @@
+"""
+** voyagercore.py - Decoding model of voyagerimb, free of any GUI dependency **
+
+Copyright (c) <2017> Manuel Arturo Izquierdo <aizquier@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import json
+import tempfile
+import collections
+import struct
+import numpy as np
+
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# * fields of the packed 24 bit samples, from the least to the most significant byte
+INT24_FIELDS = ("lo", "mid", "hi")
+
+
+def int24_dtype(endian="<"):
+    '''3 byte record dtype of packed 24 bit samples, which numpy has no integer type for.'''
+    offsets = [0, 1, 2] if endian == "<" else [2, 1, 0]
+    return np.dtype({"names": list(INT24_FIELDS), "formats": ["u1"] * 3, "offsets": offsets, "itemsize": 3})
+
+
+def read_wav(filename, mmap=True):
+    '''Reads the PCM payload of a .wav file.
+
+    Returns a tuple (rate, data) like scipy.io.wavfile.read, but by default
+    `data` is a read-only np.memmap over the file, so opening is instant and
+    only the pages actually indexed are read from disk. Besides the plain
+    RIFF layout it accepts WAVE_FORMAT_EXTENSIBLE headers, RF64 files,
+    chunks following the data chunk and data chunks with a bogus size (as
+    left by streaming recorders). 24 bit samples are mapped as 3 byte
+    records (see int24_dtype), SampleStore unpacks them as they are read.
+    '''
+    filesize = os.path.getsize(filename)
+    with open(filename, 'rb') as f:
+        header = f.read(12)
+        if len(header) < 12 or header[8:12] != b'WAVE' or header[:4] not in (b'RIFF', b'RIFX', b'RF64'):
+            raise ValueError("%s is not a RIFF/WAVE file" % (filename))
+        endian = '>' if header[:4] == b'RIFX' else '<'
+
+        fmt = None
+        data_start = data_size = None
+        ds64_data_size = None
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                break
+            chunk_id = chunk_header[:4]
+            chunk_size = struct.unpack(endian + 'I', chunk_header[4:])[0]
+            chunk_start = f.tell()
+
+            if chunk_id == b'ds64':
+                ds64_data_size = struct.unpack('<Q', f.read(16)[8:16])[0]
+            elif chunk_id == b'fmt ':
+                fmt = f.read(chunk_size)
+            elif chunk_id == b'data':
+                data_start = chunk_start
+                if chunk_size == 0xFFFFFFFF and ds64_data_size is not None:
+                    chunk_size = ds64_data_size
+                # * streamed or truncated files: the payload ends with the file
+                if chunk_size == 0 or chunk_start + chunk_size > filesize:
+                    chunk_size = filesize - chunk_start
+                data_size = chunk_size
+                if fmt is not None:
+                    break
+
+            # * chunks are word aligned
+            f.seek(chunk_start + chunk_size + (chunk_size & 1))
+
+    if fmt is None or data_start is None:
+        raise ValueError("%s has no fmt or data chunk" % (filename))
+
+    format_tag, channels, rate, _, block_align, bits = struct.unpack(endian + 'HHIIHH', fmt[:16])
+    if format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        # * the actual format is the first two bytes of the SubFormat GUID
+        format_tag = struct.unpack(endian + 'H', fmt[24:26])[0]
+
+    sample_size = block_align // channels if channels else 0
+    if format_tag == WAVE_FORMAT_PCM and sample_size in (1, 2, 3, 4, 8):
+        dtype = {1: 'u1', 2: 'i2', 4: 'i4', 8: 'i8'}.get(sample_size)
+    elif format_tag == WAVE_FORMAT_IEEE_FLOAT and sample_size in (4, 8):
+        dtype = 'f%d' % (sample_size)
+    else:
+        raise ValueError("Unsupported wav format (tag 0x%04x, %d bits)" % (format_tag, bits))
+    dtype = int24_dtype(endian) if dtype is None else np.dtype(endian + dtype)
+
+    frames = data_size // block_align
+    if frames == 0:
+        data = np.zeros((0, channels), dtype=dtype)
+    elif mmap:
+        data = np.memmap(filename, dtype=dtype, mode='r', offset=data_start, shape=(frames, channels))
+    else:
+        with open(filename, 'rb') as f:
+            f.seek(data_start)
+            data = np.fromfile(f, dtype=dtype, count=frames * channels).reshape(frames, channels)
+
+    if channels == 1:
+        data = data[:, 0]
+
+    return rate, data
+
+
+class SampleStore(object):
+    '''Samples of a recording kept in their compact stored type, read as float32 in [-1, 1).
+
+    Wraps the (usually memory-mapped) array returned by read_wav. Indexing
+    it works like indexing the array, but only the indexed samples are
+    converted, chunk by chunk as the decoder reads them, so the whole file
+    is never promoted to floats at once. Integer samples are scaled by the
+    full range of their type (8 bit samples, which are unsigned, are also
+    centered on zero), so every file shows the same amplitude range no
+    matter its bit depth. Packed 24 bit samples are unpacked the same way,
+    only for the indexed span.
+    '''
+
+    dtype = np.dtype(np.float32)
+
+    def __init__(self, data):
+        self.data = data
+        self.bias = 0.0
+        self.scale = 1.0
+        self.packed = data.dtype.names == INT24_FIELDS
+        if self.packed:
+            # * unpacked left justified in 32 bits, as scipy.io.wavfile does
+            self.scale = 1.0 / 2.0 ** 31
+        elif data.dtype.kind == 'u':
+            self.bias = 2.0 ** (8 * data.dtype.itemsize - 1)
+            self.scale = 1.0 / self.bias
+        elif data.dtype.kind == 'i':
+            self.scale = 1.0 / 2.0 ** (8 * data.dtype.itemsize - 1)
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def ndim(self):
+        return self.data.ndim
+
+    @property
+    def nbytes(self):
+        '''Size of the stored samples, not of their float32 conversion.'''
+        return self.data.nbytes
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, key):
+        chunk = np.asarray(self.data[key])
+        if self.packed:
+            chunk = (chunk["lo"].astype(np.int32) << 8) | (chunk["mid"].astype(np.int32) << 16) \
+                | (chunk["hi"].astype(np.int32) << 24)
+        samples = chunk.astype(np.float32)
+        if self.bias:
+            samples -= np.float32(self.bias)
+        if self.scale != 1.0:
+            samples *= np.float32(self.scale)
+        return samples if samples.ndim else samples.item()
+
+
+def gather_lines(audio_data, starts, width, channel=0):
+    '''Gathers the lines of `width` samples beginning at the offsets `starts`.
+
+    Returns a contiguous 2D array with one line per start (zeros for lines
+    not entirely within the data) and the boolean mask of the valid lines.
+    With multichannel data and `channel` None, the lines of every channel are
+    placed side by side.
+    '''
+    width = int(width)
+    starts = np.asarray(starts, dtype=np.int64)
+    channels = 1
+    if audio_data.ndim == 2 and channel is None:
+        channels = audio_data.shape[1]
+
+    lines = np.zeros((len(starts), width * channels), dtype=audio_data.dtype)
+    valid = (starts >= 0) & (starts + width <= len(audio_data))
+    if width <= 0 or not valid.any():
+        return lines, valid
+
+    starts = starts[valid]
+    # * read only the span of samples touched by the lines, then gather them
+    # * at once with fancy indexing
+    lo, hi = starts.min(), starts.max() + width
+    if audio_data.ndim == 2 and channel is not None:
+        # * strided view over the interleaved samples, no copy
+        block = audio_data[lo:hi, channel]
+    else:
+        block = audio_data[lo:hi]
+    gathered = np.asarray(block)[(starts - lo)[:, np.newaxis] + np.arange(width)]
+    if gathered.ndim == 3:
+        # * (scans, samples, channels) -> channel images side by side
+        gathered = gathered.transpose(0, 2, 1).reshape(len(starts), -1)
+    lines[valid] = gathered
+    return lines, valid
+
+
+def line_starts(offset, scan_line_width, number_of_scans, adjust=0.0):
+    '''Offsets of the scan lines of a frame: int(offset + k * (scan_line_width + adjust)).'''
+    return np.floor(offset + np.arange(int(number_of_scans)) * (scan_line_width + adjust)).astype(np.int64)
+
+
+SINC_TAPS = 16
+SINC_PHASES = 256
+
+
+def _sinc_table(taps=SINC_TAPS, phases=SINC_PHASES):
+    '''Polyphase table of Blackman windowed sinc kernels, one row per fractional phase.'''
+    t = np.arange(taps) - (taps // 2 - 1)
+    x = t[np.newaxis, :] - np.arange(phases)[:, np.newaxis] / float(phases)
+    window = 0.42 + 0.5 * np.cos(np.pi * x / (taps // 2)) + 0.08 * np.cos(2 * np.pi * x / (taps // 2))
+    table = np.sinc(x) * window
+    return (table / table.sum(axis=1, keepdims=True)).astype(np.float32)
+
+
+_sinc_kernels = None
+
+
+def _interpolation_kernel(interpolation, fraction):
+    '''Tap offsets and per line weights interpolating the samples at fractional positions `fraction`.'''
+    global _sinc_kernels
+    f = fraction.astype(np.float32)[:, np.newaxis]
+    if interpolation == "linear":
+        return np.arange(2), np.hstack([1 - f, f])
+    if interpolation == "cubic":
+        # * Catmull-Rom spline
+        return np.arange(-1, 3), 0.5 * np.hstack([
+            -f + 2 * f ** 2 - f ** 3,
+            2 - 5 * f ** 2 + 3 * f ** 3,
+            f + 4 * f ** 2 - 3 * f ** 3,
+            -f ** 2 + f ** 3
+        ])
+    if interpolation == "sinc":
+        if _sinc_kernels is None:
+            _sinc_kernels = _sinc_table()
+        phases = np.round(fraction * SINC_PHASES).astype(np.int64)
+        return np.arange(SINC_TAPS) - (SINC_TAPS // 2 - 1), _sinc_kernels[phases]
+    raise ValueError("Unknown interpolation %s" % (interpolation))
+
+
+INTERPOLATIONS = ("nearest", "linear", "cubic", "sinc")
+
+
+def resample_lines(audio_data, starts, width, channel=0, interpolation="linear"):
+    '''Gathers lines of `width` samples beginning at the fractional offsets `starts`.
+
+    Every line is interpolated at its exact start, with the same kernel for
+    all its samples, so a frame costs one multiply-add over the frame per
+    kernel tap. Returns (lines, valid) as gather_lines does, in float32.
+    '''
+    width = int(width)
+    starts = np.asarray(starts, dtype=np.float64)
+    if audio_data.ndim == 2 and channel is None:
+        resampled = [resample_lines(audio_data, starts, width, c, interpolation) for c in range(audio_data.shape[1])]
+        return np.hstack([lines for lines, _ in resampled]), resampled[0][1]
+
+    first = np.floor(starts)
+    fraction = starts - first
+    # * the sinc table has a phase for fraction 1.0, the same as phase 0 of the next sample
+    if interpolation == "sinc":
+        next_sample = np.round(fraction * SINC_PHASES) == SINC_PHASES
+        first[next_sample] += 1
+        fraction[next_sample] = 0.0
+    offsets, weights = _interpolation_kernel(interpolation, fraction)
+
+    window = width + len(offsets) - 1
+    extended = first.astype(np.int64) + offsets[0]
+    lines, inside = gather_lines(audio_data, extended, window, channel)
+    # * a line is valid when its nominal span is within the data, even if the
+    # * kernel reaches past the ends: those taps repeat the first/last sample
+    valid = (starts >= 0) & (starts + width <= len(audio_data))
+    for n in np.flatnonzero(valid & ~inside):
+        lo, hi = max(extended[n], 0), min(extended[n] + window, len(audio_data))
+        edge, _ = gather_lines(audio_data, [lo], hi - lo, channel)
+        lines[n] = np.pad(edge[0], (lo - extended[n], extended[n] + window - hi), mode="edge")
+    lines = lines.astype(np.float32, copy=False)
+    resampled = np.zeros((len(starts), width), dtype=np.float32)
+    for tap in range(len(offsets)):
+        resampled += weights[:, tap, np.newaxis] * lines[:, tap:tap + width]
+    return resampled, valid
+
+
+def get_segment(audio_data, offset, scan_line_width, number_of_scans, adjust=0.0, invert_signal=False,
+                channel=0, interpolation="nearest"):
+    '''Decodes a frame of `number_of_scans` lines of `scan_line_width` samples.
+
+    Line `k` starts at int(offset + k * (scan_line_width + adjust)). Returns a
+    tuple (image, offset_exceeded) where image is a contiguous 2D array; lines
+    running past the end of the data are filled with zeros.
+
+    `audio_data` may be mono (1D) or interleaved multichannel (frames x
+    channels). For the latter `channel` selects the channel to decode, or, if
+    None, every channel is decoded and the images are placed side by side.
+
+    With an `interpolation` other than "nearest" ("linear", "cubic" or
+    "sinc") line `k` is resampled at the exact, fractional offset
+    offset + k * (scan_line_width + adjust) instead, and image is float32.
+    '''
+    if interpolation == "nearest":
+        starts = line_starts(offset, scan_line_width, max(int(number_of_scans), 0), adjust)
+        image, valid = gather_lines(audio_data, starts, scan_line_width, channel)
+    else:
+        starts = offset + np.arange(max(int(number_of_scans), 0)) * (scan_line_width + adjust)
+        image, valid = resample_lines(audio_data, starts, scan_line_width, channel, interpolation)
+
+    if invert_signal:
+        np.negative(image, out=image)
+
+    return image, not valid.all()
+
+
+def _cross_correlate(windows, references):
+    '''Batched cross-correlation of each window with its reference line (or a single template).
+
+    Returns corr[k, lag] = sum_t windows[k, lag + t] * references[k, t] for
+    every lag at which the reference fits entirely within the window.
+    '''
+    windows = windows - windows.mean(axis=-1, keepdims=True)
+    references = references - references.mean(axis=-1, keepdims=True)
+    lags = windows.shape[-1] - references.shape[-1] + 1
+    nfft = 1 << int(np.ceil(np.log2(windows.shape[-1] + references.shape[-1])))
+    spectrum = np.fft.rfft(windows, nfft) * np.conj(np.fft.rfft(references, nfft))
+    return np.fft.irfft(spectrum, nfft)[..., :lags]
+
+
+ALIGN_MODES = ("sync", "previous")
+
+
+def align_segment(audio_data, offset, scan_line_width, number_of_scans, adjust=0.0, invert_signal=False,
+                  channel=0, mode="sync", search=None, sync_width=None):
+    '''Decodes a frame correcting the drift of every scan line.
+
+    Each line is shifted by up to `search` samples (default: 2% of the scan
+    line width) from its nominal start, as given by get_segment:
+
+    - "sync": locks every line to the sync pulse of the first one, by
+      cross-correlating the first `sync_width` samples (default: 5% of the
+      line) of each line with those of the first line.
+    - "previous": locks every line to the previous one, by cross-correlating
+      whole consecutive lines. Shifts accumulate from line to line.
+
+    The correlations of all the lines are computed at once with the FFT.
+    Returns a tuple (image, starts, offset_exceeded) where `starts` holds the
+    corrected offsets of the lines.
+    '''
+    if mode not in ALIGN_MODES:
+        raise ValueError("Unknown alignment mode %s" % (mode))
+    scan_line_width = int(scan_line_width)
+    if search is None:
+        search = max(scan_line_width // 50, 2)
+    if sync_width is None:
+        sync_width = max(scan_line_width // 20, 8)
+
+    # * correlations are measured on a single channel, all of them share the tape wobble
+    reference_channel = 0 if channel is None else channel
+    starts = line_starts(offset, scan_line_width, max(int(number_of_scans), 0), adjust)
+
+    if len(starts) > 1:
+        if mode == "sync":
+            windows, valid = gather_lines(audio_data, starts - search, sync_width + 2 * search, reference_channel)
+            # * the template is read on its own: the window of the first line
+            # * is invalid when the frame starts less than `search` samples in
+            template, template_valid = gather_lines(audio_data, starts[:1], sync_width, reference_channel)
+            if template_valid[0]:
+                corr = _cross_correlate(windows.astype(np.float64), template.astype(np.float64))
+                shifts = np.argmax(corr, axis=1) - search
+                shifts[~valid] = 0
+            else:
+                shifts = np.zeros(len(starts), dtype=np.int64)
+        else:
+            lines, valid_lines = gather_lines(audio_data, starts, scan_line_width, reference_channel)
+            windows, valid = gather_lines(audio_data, starts[1:] - search, scan_line_width + 2 * search,
+                                          reference_channel)
+            corr = _cross_correlate(windows.astype(np.float64), lines[:-1].astype(np.float64))
+            steps = np.argmax(corr, axis=1) - search
+            steps[~(valid & valid_lines[:-1])] = 0
+            shifts = np.concatenate([[0], np.cumsum(steps)])
+        starts = starts + shifts
+
+    image, valid = gather_lines(audio_data, starts, scan_line_width, channel)
+    if invert_signal:
+        np.negative(image, out=image)
+
+    return image, starts, not valid.all()
+
+
+def load_wav(filename):
+    '''Memory-maps a .wav file, falling back to scipy for formats read_wav does not know.
+
+    Returns (rate, SampleStore) with the samples scaled to [-1, 1).
+    '''
+    try:
+        rate, data = read_wav(filename)
+    except ValueError:
+        import scipy.io.wavfile
+        rate, data = scipy.io.wavfile.read(filename, mmap=True)
+    return rate, SampleStore(data)
+
+
+def frame_offsets(number_of_samples, offset, scan_line_width, number_of_scans, adjust=0.0):
+    '''Offsets of the consecutive whole frames from `offset` to the end of the data.'''
+    frame_span = number_of_scans * (scan_line_width + adjust)
+    if frame_span <= 0:
+        return []
+    last_line = (number_of_scans - 1) * (scan_line_width + adjust) + scan_line_width
+    count = int(np.floor((number_of_samples - offset - last_line) / frame_span)) + 1
+    return [int(offset + i * frame_span) for i in range(max(count, 0))]
+
+
+NORMALIZATIONS = ("minmax", "percentile", "equalize")
+
+
+def normalize(image_data, method="minmax", bits=8, percentiles=(0.5, 99.5)):
+    '''Maps the samples of a decoded frame to 8 or 16 bit gray levels.
+
+    - "minmax": the frame minimum is black and its maximum is white.
+    - "percentile": the given low/high percentiles are black and white, so
+      a few clicks or spikes do not wash out the contrast.
+    - "equalize": histogram equalization.
+
+    Works on a single float32 copy of the frame, modified in place.
+    '''
+    if method not in NORMALIZATIONS:
+        raise ValueError("Unknown normalization %s" % (method))
+    dtype = {8: np.uint8, 16: np.uint16}[bits]
+    white = float(2 ** bits - 1)
+    data = np.array(image_data, dtype=np.float32)
+    if data.size == 0:
+        return data.astype(dtype)
+
+    if method == "equalize":
+        levels = 2 ** bits
+        histogram, edges = np.histogram(data, bins=levels)
+        cdf = np.cumsum(histogram).astype(np.float64)
+        cdf = (cdf - cdf[0]) / max(cdf[-1] - cdf[0], 1) * white
+        data[...] = np.interp(data, edges[1:], cdf)
+        return data.astype(dtype)
+
+    if method == "percentile":
+        lo, hi = np.percentile(data, percentiles)
+    else:
+        lo, hi = data.min(), data.max()
+    if hi <= lo:
+        return np.zeros(data.shape, dtype=dtype)
+    data -= lo
+    data *= white / (hi - lo)
+    np.clip(data, 0, white, out=data)
+    return data.astype(dtype)
+
+
+def to_image(image_data, resize=False, method="minmax", bits=8):
+    '''Builds a PIL image of a decoded frame, optionally resized to a 3:4 ratio.'''
+    from PIL import Image
+    levels = normalize(image_data, method, bits)
+    # * uint8 levels make an "L" image, uint16 levels an "I;16" one
+    image = Image.fromarray(levels)
+    if resize:
+        image = image.resize((image.width, int(image.width * (4.0/ 3.0)) ))
+    return image
+
+
+class FrameWriter(object):
+    '''Writes decoded frames one at a time, to a multi-page TIFF or to an image sequence.
+
+    With `stack` the frames are appended as pages of the TIFF file
+    `filename`; otherwise `filename` is a pattern like "image_%04d.png",
+    formatted with the number of each frame. Frames are written as they
+    come, so a long export never holds more than one frame in memory.
+    '''
+
+    def __init__(self, filename, stack=False, resize=False, method="minmax", bits=8):
+        self.filename = filename
+        self.stack = stack
+        self.resize = resize
+        self.method = method
+        self.bits = bits
+        self.count = 0
+        self.tiff = None
+        if stack:
+            from PIL import TiffImagePlugin
+            self.tiff = TiffImagePlugin.AppendingTiffWriter(filename, new=True)
+
+    def write(self, image_data):
+        '''Writes a frame, returns the name of the file written.'''
+        image = to_image(image_data, self.resize, self.method, self.bits)
+        if self.stack:
+            image.save(self.tiff, format="TIFF")
+            self.tiff.newFrame()
+            filename = self.filename
+        else:
+            filename = self.filename % (self.count)
+            image.save(filename)
+        self.count += 1
+        return filename
+
+    def close(self):
+        if self.tiff is not None:
+            self.tiff.close()
+            self.tiff = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def estimate_scan_line_width(audio_data, offset, scan_line_width, number_of_lines=32, tolerance=0.25, channel=0):
+    '''Estimates the scan line period by autocorrelation of the signal.
+
+    Looks for the autocorrelation peak of `number_of_lines` lines of signal
+    starting at `offset`, with a lag within `tolerance` (relative) of the
+    current `scan_line_width`. The period is refined to sub-sample precision
+    by parabolic interpolation of the peak at a multiple of the line period.
+    Returns the period in samples (a float), or None if there is not enough
+    data.
+    '''
+    max_lag = int(np.ceil(scan_line_width * (1.0 + tolerance)))
+    min_lag = max(int(np.floor(scan_line_width * (1.0 - tolerance))), 2)
+    window = audio_data[int(offset):int(offset) + number_of_lines * max_lag]
+    if window.ndim == 2:
+        window = window[:, 0 if channel is None else channel]
+    if len(window) < 2 * max_lag:
+        return None
+
+    x = np.asarray(window, dtype=np.float64)
+    x = x - x.mean()
+    n = len(x)
+    # * Wiener-Khinchin: autocorrelation as the inverse FFT of the power spectrum
+    nfft = 1 << int(np.ceil(np.log2(2 * n)))
+    spectrum = np.fft.rfft(x, nfft)
+    r = np.fft.irfft(spectrum.real ** 2 + spectrum.imag ** 2, nfft)[:n]
+    # * unbiased estimate: normalize each lag by the number of overlapping samples
+    r /= np.arange(n, 0, -1)
+
+    def parabolic_peak(lo, hi):
+        k = lo + int(np.argmax(r[lo:hi + 1]))
+        if k <= 0 or k >= n - 1:
+            return float(k)
+        y0, y1, y2 = r[k - 1], r[k], r[k + 1]
+        denominator = y0 - 2.0 * y1 + y2
+        return k + (0.5 * (y0 - y2) / denominator if denominator != 0 else 0.0)
+
+    period = parabolic_peak(min_lag, max_lag)
+
+    # * the error of the interpolated peak is spread over `multiple` periods
+    multiple = max((n // max_lag) // 2, 1)
+    if multiple > 1:
+        center = multiple * period
+        lo, hi = int(center - multiple), int(np.ceil(center + multiple))
+        if hi < n - 1:
+            period = parabolic_peak(lo, hi) / multiple
+
+    return float(period)
+
+
+def split_period(period):
+    '''Splits a line period into an integer scan line width plus an adjust.'''
+    scan_line_width = int(round(period))
+    return scan_line_width, period - scan_line_width
+
+
+def line_coherence(image_data, block=64):
+    '''Quality score of decoded frames: how well their scan lines line up, from 0 to 1.
+
+    Every line is reduced to zero mean and unit norm, then the lines are
+    averaged in blocks of `block` consecutive lines. With the right line
+    period the vertical structures (the sync pulse, the edges of the
+    picture) of a block add up and the squared norm of the average is
+    high; a wrong period shears the block and smears them. `image_data` may
+    be a stack of frames (..., lines, samples), one score per frame is
+    returned.
+    '''
+    lines = np.asarray(image_data, dtype=np.float32)
+    lines = lines - lines.mean(axis=-1, keepdims=True)
+    lines /= np.maximum(np.sqrt(np.einsum('...i,...i->...', lines, lines))[..., np.newaxis], 1e-12)
+    count = lines.shape[-2] - lines.shape[-2] % block if lines.shape[-2] >= block else lines.shape[-2]
+    blocks = lines[..., :count, :].reshape(lines.shape[:-2] + (-1, min(block, count), lines.shape[-1]))
+    means = blocks.mean(axis=-2)
+    return np.einsum('...i,...i->...', means, means).mean(axis=-1)
+
+
+def search_line_period(audio_data, offset, scan_line_width, number_of_scans, adjust=0.0, channel=0, span=2.0,
+                       steps=(0.25, 0.02), line_steps=(4, 2), block=64, batch=8):
+    '''Searches the line period of a frame that maximizes line_coherence, coarse to fine.
+
+    Periods within `span` samples of scan_line_width + adjust are scored in
+    steps of steps[0], on every line_steps[0]-th line; then, around the best
+    period of each level, within one step of it, in the next (finer) step.
+    The last level steps 1 / number_of_scans, where the last line of the
+    frame moves by one sample, on every line. The audio of the frame is read
+    once and shared by all the candidates, which are decoded and scored
+    `batch` at a time. Returns (period, score), or None if the frame runs
+    past the end of the data.
+    '''
+    width = int(scan_line_width)
+    number_of_scans = int(number_of_scans)
+    offset = int(offset)
+    period = scan_line_width + adjust
+    stop = offset + int(np.ceil((number_of_scans - 1) * (period + span))) + width + 1
+    if offset < 0 or stop > len(audio_data) or period - span <= 0 or number_of_scans < 2:
+        return None
+    if audio_data.ndim == 2:
+        samples = np.asarray(audio_data[offset:stop, 0 if channel is None else channel], dtype=np.float32)
+    else:
+        samples = np.asarray(audio_data[offset:stop], dtype=np.float32)
+
+    def scores(periods, line_step):
+        lines = np.arange(0, number_of_scans, line_step)
+        result = []
+        for n in range(0, len(periods), batch):
+            starts = np.floor(lines * periods[n:n + batch, np.newaxis]).astype(np.int64)
+            frames = samples[starts[..., np.newaxis] + np.arange(width)]
+            result.append(line_coherence(frames, max(block // line_step, 2)))
+        return np.concatenate(result)
+
+    steps = list(steps) + [1.0 / number_of_scans]
+    line_steps = list(line_steps) + [1] * (len(steps) - len(line_steps))
+    best, score, radius = period, None, span
+    for step, line_step in zip(steps, line_steps):
+        # * the finer levels stay within the span, the samples read do not reach further
+        periods = np.unique(np.clip(best + np.arange(-radius, radius + step / 2.0, step), period - span, period + span))
+        level = scores(periods, line_step)
+        best, score, radius = periods[np.argmax(level)], level.max(), step
+    return float(best), float(score)
+
+
+def _channel_samples(audio_data, start, stop, channel=0):
+    '''Samples [start, stop) of one channel as a float64 array.'''
+    if audio_data.ndim == 2:
+        chunk = audio_data[start:stop, 0 if channel is None else channel]
+    else:
+        chunk = audio_data[start:stop]
+    return np.asarray(chunk, dtype=np.float64)
+
+
+def find_sync_pulses(audio_data, line_period, threshold=None, polarity=None, min_width=None, channel=0,
+                     chunk_size=1 << 22):
+    '''Finds the offsets of the scan line sync pulses in one streaming pass.
+
+    A pulse is a run of at least `min_width` samples (default: 0.5% of a
+    line) where polarity * signal stays above `threshold`, starting at least
+    half a line period after the previous pulse. By default the polarity is
+    the sign of the largest excursions of the signal and the threshold is
+    3/4 of its 99.9th percentile, both measured on a decimated copy of the
+    data. Returns an array with the sample offsets where the pulses start.
+    '''
+    n = len(audio_data)
+    min_distance = 0.5 * line_period
+    if min_width is None:
+        min_width = max(int(0.005 * line_period), 1)
+    if polarity is None or threshold is None:
+        step = max(n // (1 << 20), 1)
+        sample = audio_data[::step]
+        if sample.ndim == 2:
+            sample = sample[:, 0 if channel is None else channel]
+        sample = np.asarray(sample, dtype=np.float64)
+        if polarity is None:
+            polarity = 1 if np.percentile(sample, 99.9) >= -np.percentile(sample, 0.1) else -1
+        if threshold is None:
+            threshold = 0.75 * np.percentile(polarity * sample, 99.9)
+
+    pulses = []
+    open_rise = None
+    previous_pulse = -np.inf
+    for start in range(0, n, chunk_size):
+        above = polarity * _channel_samples(audio_data, start, start + chunk_size, channel) > threshold
+        # * boundaries of the runs above threshold: rises at even, falls at odd positions
+        change = np.flatnonzero(np.diff(np.concatenate([[False], above, [False]]).astype(np.int8)))
+        rises, falls = change[0::2] + start, change[1::2] + start
+        if open_rise is not None:
+            if len(rises) and rises[0] == start:
+                rises[0] = open_rise
+            else:
+                # * the run ended exactly on the chunk boundary
+                rises = np.concatenate([[open_rise], rises])
+                falls = np.concatenate([[start], falls])
+        open_rise = None
+        if len(falls) and falls[-1] == start + len(above) and start + len(above) < n:
+            # * the last run goes on in the next chunk
+            open_rise = rises[-1]
+            rises, falls = rises[:-1], falls[:-1]
+
+        candidates = rises[falls - rises >= min_width]
+        if len(candidates):
+            gaps = np.diff(np.concatenate([[previous_pulse], candidates]))
+            pulses.append(candidates[gaps > min_distance])
+            previous_pulse = candidates[-1]
+
+    return np.concatenate(pulses).astype(np.int64) if pulses else np.zeros(0, dtype=np.int64)
+
+
+def find_frames(pulses, line_period, number_of_scans, min_lines=None, tolerance=0.02):
+    '''Groups sync pulses into frames.
+
+    Consecutive pulses one line period apart (within `tolerance`, relative)
+    form runs of scan lines; anything else is a gap between images. Every
+    run of at least `min_lines` lines (default: a quarter of a frame) starts
+    a frame, and runs longer than `number_of_scans` lines are split into
+    back to back frames. Returns the list of frame start offsets.
+    '''
+    if min_lines is None:
+        min_lines = max(number_of_scans // 4, 1)
+    if len(pulses) < 2:
+        return []
+
+    is_line = np.abs(np.diff(pulses) - line_period) < tolerance * line_period
+    bounds = np.diff(np.concatenate([[0], is_line.astype(np.int8), [0]]))
+    run_starts = np.flatnonzero(bounds == 1)
+    # * n line periods in a row are n + 1 scan lines
+    run_lines = np.flatnonzero(bounds == -1) - run_starts + 1
+
+    frames = []
+    for run_start, lines in zip(run_starts, run_lines):
+        if lines < min_lines:
+            continue
+        for k in range(max(lines // number_of_scans, 1)):
+            frames.append(int(pulses[run_start + k * number_of_scans]))
+    return frames
+
+
+FRAME_INDEX_VERSION = 2
+
+
+def channel_suffix(channel):
+    '''Part of the sidecar file names telling the channel they were built from.'''
+    return "all" if channel is None else "ch%d" % (channel)
+
+
+def write_sidecar(filename, write, binary=False):
+    '''Writes a sidecar file with write(f) on a temporary file then renamed over `filename`.
+
+    Readers, including other processes building the same sidecar, never
+    see a partially written file.
+    '''
+    fd, temporary = tempfile.mkstemp(prefix=os.path.basename(filename) + ".", suffix=".tmp",
+                                     dir=os.path.dirname(os.path.abspath(filename)))
+    try:
+        with os.fdopen(fd, "wb" if binary else "w") as f:
+            write(f)
+        os.replace(temporary, filename)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+def frame_index_filename(filename, channel=0):
+    return "%s.index.%s.json" % (filename, channel_suffix(channel))
+
+
+def frame_index(filename, audio_data, scan_line_width, number_of_scans, adjust=0.0, channel=0, cache=True):
+    '''Frame start offsets of a whole recording, cached in a sidecar file.
+
+    The indexes of a channel are stored as JSON next to the .wav file, one
+    per set of decoding parameters, and reused as long as the file is
+    unchanged.
+    '''
+    stat = os.stat(filename)
+    key = {"version": FRAME_INDEX_VERSION, "size": stat.st_size, "mtime": stat.st_mtime}
+    parameters = json.dumps([int(scan_line_width), int(number_of_scans), float(adjust)])
+    sidecar = frame_index_filename(filename, channel)
+
+    def read_indexes():
+        try:
+            with open(sidecar) as f:
+                stored = json.load(f)
+            if stored.get("key") == key:
+                return stored["indexes"]
+        except (IOError, ValueError, KeyError):
+            pass
+        return {}
+
+    if cache:
+        indexes = read_indexes()
+        if parameters in indexes:
+            return indexes[parameters]
+
+    line_period = scan_line_width + adjust
+    frames = find_frames(find_sync_pulses(audio_data, line_period, channel=channel), line_period, number_of_scans)
+
+    if cache:
+        # * read again: the indexes of other parameters may have been saved meanwhile
+        indexes = read_indexes()
+        indexes[parameters] = frames
+        try:
+            write_sidecar(sidecar, lambda f: json.dump({"key": key, "indexes": indexes}, f))
+        except IOError:
+            print("Cannot write the frame index %s" % (sidecar))
+    return frames
+
+
+class FrameCache(object):
+    '''Least recently used cache of decoded frames within a memory budget.
+
+    Values are tuples whose ndarray items count against `budget` (bytes).
+    Cached arrays are made read-only, as they are shared by every hit.
+    '''
+
+    def __init__(self, budget=256 * 2 ** 20):
+        self.budget = budget
+        self.frames = collections.OrderedDict()
+        self.nbytes = 0
+
+    @staticmethod
+    def size_of(value):
+        return sum(item.nbytes for item in value if isinstance(item, np.ndarray))
+
+    def get(self, key):
+        value = self.frames.get(key)
+        if value is not None:
+            self.frames.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        for item in value:
+            if isinstance(item, np.ndarray):
+                item.flags.writeable = False
+        if key in self.frames:
+            self.nbytes -= self.size_of(self.frames.pop(key))
+        size = self.size_of(value)
+        if size > self.budget:
+            return value
+        self.frames[key] = value
+        self.nbytes += size
+        self.shrink()
+        return value
+
+    def shrink(self):
+        while self.nbytes > self.budget and self.frames:
+            self.nbytes -= self.size_of(self.frames.popitem(last=False)[1])
+
+    def set_budget(self, budget):
+        self.budget = budget
+        self.shrink()
+
+    def clear(self):
+        self.frames.clear()
+        self.nbytes = 0
+
+
+class EnvelopePyramid(object):
+    '''Multi-resolution min/max/RMS envelope of a whole recording.
+
+    Level 0 holds the envelope of blocks of `base_block` samples, each next
+    level merges `factor` blocks of the previous one. Any span of the signal
+    can then be summarized for a given number of pixels by reading at most
+    `factor` blocks per pixel, whatever the length of the span.
+    '''
+
+    def __init__(self, levels, base_block=256, factor=4, length=0):
+        # * levels: list of (mins, maxs, mean squares) arrays, finest first
+        self.levels = levels
+        self.base_block = base_block
+        self.factor = factor
+        self.length = length
+
+    @classmethod
+    def build(cls, audio_data, channel=0, base_block=256, factor=4, chunk_size=1 << 22):
+        '''Builds the pyramid in one streaming pass over the data.'''
+        chunk_size -= chunk_size % base_block
+        mins, maxs, squares = [], [], []
+        for start in range(0, len(audio_data), chunk_size):
+            x = _channel_samples(audio_data, start, start + chunk_size, channel)
+            if len(x) % base_block:
+                # * last block of the file: pad repeating its last sample
+                x = np.concatenate([x, np.repeat(x[-1], base_block - len(x) % base_block)])
+            blocks = x.reshape(-1, base_block)
+            mins.append(blocks.min(axis=1))
+            maxs.append(blocks.max(axis=1))
+            squares.append(np.einsum('ij,ij->i', blocks, blocks) / base_block)
+
+        if not mins:
+            return cls([], base_block, factor, 0)
+        level = (np.concatenate(mins).astype(np.float32),
+                 np.concatenate(maxs).astype(np.float32),
+                 np.concatenate(squares).astype(np.float32))
+        levels = [level]
+        while len(level[0]) > 1:
+            level = tuple(cls._merge(array, factor, reduce)
+                          for array, reduce in zip(level, (np.minimum, np.maximum, np.add)))
+            level = (level[0], level[1], level[2] / factor)
+            levels.append(level)
+        return cls(levels, base_block, factor, len(audio_data))
+
+    @staticmethod
+    def _merge(array, factor, reduce):
+        return reduce.reduceat(array, np.arange(0, len(array), factor))
+
+    def block_size(self, level):
+        return self.base_block * self.factor ** level
+
+    def envelope(self, start, stop, pixels):
+        '''Min, max and RMS of the samples [start, stop) over `pixels` equal columns.'''
+        start, stop = max(int(start), 0), min(int(stop), self.length)
+        pixels = int(pixels)
+        if not self.levels or stop <= start or pixels <= 0:
+            empty = np.zeros(0, dtype=np.float32)
+            return empty, empty, empty
+
+        samples_per_pixel = float(stop - start) / pixels
+        level = 0
+        while level + 1 < len(self.levels) and self.block_size(level + 1) <= samples_per_pixel:
+            level += 1
+        block = self.block_size(level)
+        mins, maxs, squares = self.levels[level]
+
+        first, last = start // block, min((stop - 1) // block + 1, len(mins))
+        # * first block of every pixel column; zoomed in further than one block per pixel,
+        # * consecutive columns show the same block
+        columns = first + (np.arange(pixels) * samples_per_pixel / block).astype(np.int64)
+        columns = np.minimum(columns, last - 1)
+        bounds, index = np.unique(columns, return_index=True)
+        column_mins = np.minimum.reduceat(mins[first:last], bounds - first)
+        column_maxs = np.maximum.reduceat(maxs[first:last], bounds - first)
+        counts = np.diff(np.concatenate([bounds, [last]]))
+        column_rms = np.sqrt(np.add.reduceat(squares[first:last], bounds - first) / counts)
+        # * map the merged columns back to every pixel
+        expand = np.searchsorted(bounds, columns)
+        return column_mins[expand], column_maxs[expand], column_rms[expand]
+
+    def save(self, filename, **key):
+        arrays = {}
+        for n, (mins, maxs, squares) in enumerate(self.levels):
+            arrays["mins%d" % n], arrays["maxs%d" % n], arrays["squares%d" % n] = mins, maxs, squares
+        np.savez(filename, key=json.dumps(key), base_block=self.base_block, factor=self.factor,
+                 length=self.length, levels=len(self.levels), **arrays)
+
+    @classmethod
+    def load(cls, filename, **key):
+        '''Loads a saved pyramid, or returns None if it was saved with a different key.'''
+        with np.load(filename) as stored:
+            if json.loads(str(stored["key"])) != key:
+                return None
+            levels = [(stored["mins%d" % n], stored["maxs%d" % n], stored["squares%d" % n])
+                      for n in range(int(stored["levels"]))]
+            return cls(levels, int(stored["base_block"]), int(stored["factor"]), int(stored["length"]))
+
+
+OVERVIEW_VERSION = 2
+
+
+def overview_filename(filename, channel=0):
+    return "%s.overview.%s.npz" % (filename, channel_suffix(channel))
+
+
+def envelope_pyramid(filename, audio_data, channel=0, cache=True):
+    '''Envelope pyramid of a recording, cached in a sidecar file next to the .wav file.'''
+    stat = os.stat(filename)
+    key = {"version": OVERVIEW_VERSION, "size": stat.st_size, "mtime": stat.st_mtime, "channel": channel}
+    sidecar = overview_filename(filename, channel)
+    if cache:
+        try:
+            pyramid = EnvelopePyramid.load(sidecar, **key)
+            if pyramid is not None:
+                return pyramid
+        except (IOError, ValueError, KeyError):
+            pass
+
+    pyramid = EnvelopePyramid.build(audio_data, channel)
+    if cache:
+        try:
+            write_sidecar(sidecar, lambda f: pyramid.save(f, **key), binary=True)
+        except IOError:
+            print("Cannot write the overview %s" % (sidecar))
+    return pyramid
+
+
+SESSION_VERSION = 1
+
+
+def session_filename(filename):
+    return filename + ".session.json"
+
+
+def thumbnails_filename(filename):
+    return filename + ".session.npz"
+
+
+def thumbnail(image_data, size=256):
+    '''Every `step`-th line and sample of a decoded frame, at most `size` samples wide. Returns (step, float16 array).'''
+    step = max(int(np.ceil(image_data.shape[1] / float(size))), 1)
+    return step, np.ascontiguousarray(image_data[::step, ::step], dtype=np.float16)
+
+
+class Session(object):
+    '''Workspace of a recording: decoding parameters, tuned images and thumbnails.
+
+    `parameters` holds the last decoding parameters used on the recording,
+    `frames` maps the offset of every image the user tuned to the
+    parameters (scan_line_width, adjust...) that decode it best. Thumbnails
+    are kept by offset together with the parameters they were decoded with,
+    so they are only shown for the same image. Sessions are stored next to
+    the .wav file, as JSON plus a compressed .npz file for the thumbnails.
+    '''
+
+    def __init__(self, parameters=None, frames=None):
+        self.parameters = dict(parameters or {})
+        self.frames = dict(frames or {})
+        self.thumbnails = {}
+
+    def set_frame(self, offset, parameters):
+        self.frames[int(offset)] = dict(parameters)
+
+    def remove_frame(self, offset):
+        self.frames.pop(int(offset), None)
+        self.thumbnails.pop(int(offset), None)
+
+    def frame_table(self):
+        '''Tuned images as a list of (offset, parameters), by offset.'''
+        return sorted(self.frames.items())
+
+    def set_thumbnail(self, offset, parameters, step, image):
+        self.thumbnails[int(offset)] = (dict(parameters), int(step), image)
+
+    def get_thumbnail(self, offset, parameters):
+        '''Returns (step, thumbnail) of the image at `offset` decoded with `parameters`, or None.'''
+        stored = self.thumbnails.get(int(offset))
+        if stored is None or stored[0] != parameters:
+            return None
+        return stored[1:]
+
+    def save(self, filename):
+        '''Saves the session of the recording `filename`.'''
+        thumbnails = sorted(self.thumbnails.items())
+        with open(session_filename(filename), "w") as f:
+            json.dump({
+                "version": SESSION_VERSION,
+                "parameters": self.parameters,
+                "frames": [dict(parameters, offset=offset) for offset, parameters in self.frame_table()],
+                "thumbnails": [{"offset": offset, "step": step, "parameters": parameters}
+                               for offset, (parameters, step, _) in thumbnails]
+            }, f, indent=1)
+        if thumbnails:
+            np.savez_compressed(thumbnails_filename(filename),
+                                **dict(("thumbnail_%d" % (offset), image) for offset, (_, _, image) in thumbnails))
+        elif os.path.exists(thumbnails_filename(filename)):
+            os.remove(thumbnails_filename(filename))
+
+    @classmethod
+    def load(cls, filename):
+        '''Loads the session of the recording `filename`, or returns None if it has none.'''
+        try:
+            with open(session_filename(filename)) as f:
+                stored = json.load(f)
+        except (IOError, ValueError):
+            return None
+        if stored.get("version") != SESSION_VERSION:
+            return None
+
+        session = cls(stored["parameters"])
+        for frame in stored["frames"]:
+            frame = dict(frame)
+            session.set_frame(frame.pop("offset"), frame)
+        if stored["thumbnails"]:
+            try:
+                with np.load(thumbnails_filename(filename)) as images:
+                    for entry in stored["thumbnails"]:
+                        session.set_thumbnail(entry["offset"], entry["parameters"], entry["step"],
+                                              images["thumbnail_%d" % (entry["offset"])])
+            except (IOError, ValueError, KeyError):
+                pass
+        return session
+
+
+def minmax_decimate(y, pixels):
+    '''Reduces a signal to a (min, max) pair per pixel column, for drawing.
+
+    Returns (x, values) ready to plot: the sample index of every column,
+    repeated, and its minimum and maximum. Signals shorter than two points
+    per pixel are returned as they are.
+    '''
+    n = len(y)
+    pixels = max(int(pixels), 1)
+    if n <= 2 * pixels:
+        return np.arange(n), y
+    bounds = (np.arange(pixels) * n) // pixels
+    values = np.empty(2 * pixels, dtype=y.dtype)
+    values[0::2] = np.minimum.reduceat(y, bounds)
+    values[1::2] = np.maximum.reduceat(y, bounds)
+    return np.repeat(bounds, 2), values
+
+
+def phase_correlation(reference, image):
+    '''Sub-pixel translation (dy, dx) that, applied to `image`, best aligns it with `reference`.'''
+    window = np.outer(np.hanning(reference.shape[0]), np.hanning(reference.shape[1]))
+    cross = np.fft.rfft2(reference * window) * np.conj(np.fft.rfft2(image * window))
+    cross /= np.maximum(np.abs(cross), 1e-12)
+    surface = np.fft.irfft2(cross, reference.shape)
+    peak = np.unravel_index(np.argmax(surface), surface.shape)
+
+    shift = []
+    for axis, size in enumerate(surface.shape):
+        index = list(peak)
+        values = []
+        for delta in (-1, 0, 1):
+            index[axis] = (peak[axis] + delta) % size
+            values.append(surface[tuple(index)])
+        denominator = values[0] - 2 * values[1] + values[2]
+        fraction = 0.5 * (values[0] - values[2]) / denominator if denominator != 0 else 0.0
+        position = peak[axis] + fraction
+        # * peaks past the middle are negative shifts
+        shift.append(float(position - size if position > size / 2.0 else position))
+    return tuple(shift)
+
+
+def shift_image(image, dy, dx):
+    '''Translates an image by a sub-pixel amount with the Fourier shift theorem (wrapping around).'''
+    ky = np.fft.fftfreq(image.shape[0])[:, np.newaxis]
+    kx = np.fft.rfftfreq(image.shape[1])[np.newaxis, :]
+    spectrum = np.fft.rfft2(image) * np.exp(-2j * np.pi * (ky * dy + kx * dx))
+    return np.fft.irfft2(spectrum, image.shape).astype(np.float32)
+
+
+def color_frame(audio_data, offset, scan_line_width, number_of_scans, adjust=0.0, invert_signal=False,
+                channel=0, interpolation="nearest", frame_offsets=None, order="RGB", align=True):
+    '''Reconstructs a color picture from three consecutive monochrome frames.
+
+    The frames start at `frame_offsets` (e.g. from the frame index) or, by
+    default, one frame span (number_of_scans * (scan_line_width + adjust))
+    after each other from `offset`. They hold the color channels in the
+    given `order`. All their lines are decoded in a single batch, then the
+    second and third frames are aligned to the first one by phase
+    correlation. Returns a float32 array of shape (lines, samples, 3) in RGB
+    order, and the (dy, dx) shifts applied to each frame.
+    '''
+    number_of_scans = int(number_of_scans)
+    stride = scan_line_width + adjust
+    if frame_offsets is None:
+        frame_offsets = [offset + n * number_of_scans * stride for n in range(3)]
+    starts = (np.asarray(frame_offsets, dtype=np.float64)[:, np.newaxis]
+              + np.arange(number_of_scans) * stride).ravel()
+
+    if interpolation == "nearest":
+        lines, _ = gather_lines(audio_data, np.floor(starts).astype(np.int64), scan_line_width, channel)
+    else:
+        lines, _ = resample_lines(audio_data, starts, scan_line_width, channel, interpolation)
+    frames = lines.astype(np.float32).reshape(3, number_of_scans, -1)
+    if invert_signal:
+        np.negative(frames, out=frames)
+
+    shifts = [(0.0, 0.0)] * 3
+    if align:
+        for n in (1, 2):
+            shifts[n] = phase_correlation(frames[0], frames[n])
+            frames[n] = shift_image(frames[n], *shifts[n])
+
+    rgb = np.empty(frames.shape[1:] + (3, ), dtype=np.float32)
+    for n, color in enumerate(order.upper()):
+        rgb[..., "RGB".index(color)] = frames[n]
+    return rgb, [shifts[order.upper().index(color)] for color in "RGB"]
+
+
+def to_color_image(rgb, resize=False, method="minmax"):
+    '''Builds an 8 bit RGB PIL image of a color frame, normalizing each channel on its own.'''
+    from PIL import Image
+    levels = np.dstack([normalize(rgb[..., n], method, 8) for n in range(3)])
+    image = Image.fromarray(levels)
+    if resize:
+        image = image.resize((image.width, int(image.width * (4.0/ 3.0)) ))
+    return image
@@ -22,25 +22,30 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import time
+# * time to first window is measured from here
+startup_time = time.perf_counter()
+
 import sys
 import os
 import subprocess
+import bisect
+import queue
+import threading
 import numpy as np
-import scipy.io.wavfile
-import matplotlib
-matplotlib.use("TkAgg")
-import matplotlib.pyplot as plt
 import tkinter as tk
-from PIL import Image
+from tkinter import messagebox, filedialog, simpledialog
+
+from voyagercore import load_wav, get_segment, line_starts, gather_lines, align_segment, to_image, \
+    estimate_scan_line_width, split_period, frame_index, frame_offsets, envelope_pyramid, minmax_decimate, \
+    FrameCache, FrameWriter, color_frame, to_color_image, Session, thumbnail, line_coherence, search_line_period
+from voyagerprofile import Profiler
+
+# * file extensions Pillow can write 16 bit gray levels to
+EXPORT_16_BITS = (".png", ".tif", ".tiff")
 
-# * support for previous matplotlib versions (v1, v2) and the current v3 
-mpltlib3 = True if int(matplotlib.__version__.split('.')[0]) > 2 else False
-if mpltlib3:
-    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-    from tkinter import messagebox, filedialog
-else:
-    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2TkAgg
-    from tkinter import messagebox
+# * matplotlib takes most of the startup time: it is only imported, and the
+# * figure built, when the first image is about to be shown (see Imager.view_init_figure)
 
 
 class ValidatedEntry(object):
@@ -69,6 +74,65 @@ class NumericalFloatEntry(ValidatedEntry):
             return None
 
 
+class DecodeWorker(object):
+    '''Runs loading and decoding jobs on a background thread so the Tk main loop never blocks.
+
+    Jobs are submitted by kind ("load", "decode", ...). A new job supersedes
+    any pending or running job of the same kind: pending ones are skipped and
+    the results of running ones are dropped. Results are handed back to the
+    callbacks on the Tk thread, by polling with root.after.
+    '''
+
+    def __init__(self, root, poll_interval=20):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.generations = {}
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+        self.root.after(self.poll_interval, self.poll)
+
+    def submit(self, kind, function, args, callback, errback=None):
+        generation = self.generations.get(kind, 0) + 1
+        self.generations[kind] = generation
+        self.requests.put((kind, generation, function, args, callback, errback))
+
+    def cancel(self, kind):
+        self.generations[kind] = self.generations.get(kind, 0) + 1
+
+    def is_current(self, kind, generation):
+        return self.generations.get(kind) == generation
+
+    def run(self):
+        while True:
+            jobs = [self.requests.get()]
+            while True:
+                try:
+                    jobs.append(self.requests.get_nowait())
+                except queue.Empty:
+                    break
+
+            for kind, generation, function, args, callback, errback in jobs:
+                if not self.is_current(kind, generation):
+                    continue
+                try:
+                    self.results.put((kind, generation, callback, function(*args)))
+                except Exception as error:
+                    self.results.put((kind, generation, errback, error))
+
+    def poll(self):
+        while True:
+            try:
+                kind, generation, callback, result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if self.is_current(kind, generation) and callback is not None:
+                callback(result)
+        self.root.after(self.poll_interval, self.poll)
+
+
 class FileMenu(object):
     def openfile(self):
         filename = tk.filedialog.askopenfilename(
@@ -78,20 +142,97 @@ class FileMenu(object):
         )
 
         if len(filename) != 0:
-            try:
-                self.browser.model_load_audio_data(filename)
-            except:
-                print("Invalid wav file")
-                return
-            self.browser.imager.view_plot_image()
+            self.browser.model_load_audio_data(filename)
 
     def sync_invert_signal(self, *args):
         self.browser.invert_signal = self.invert_signal.get()
-        self.browser.imager.view_plot_image()
+        self.browser.view_schedule_replot()
+
+    def sync_channel(self, *args):
+        channel = self.channel.get()
+        self.browser.channel = None if channel < 0 else channel
+        if self.browser.audio_data is not None:
+            self.browser.view_schedule_replot()
+
+    def sync_align_mode(self, *args):
+        self.browser.align_mode = self.align_mode.get() or None
+        if self.browser.audio_data is not None:
+            self.browser.view_schedule_replot()
+
+    def sync_interpolation(self, *args):
+        self.browser.interpolation = self.interpolation.get()
+        if self.browser.audio_data is not None:
+            self.browser.view_schedule_replot()
+
+    def set_cache_size(self):
+        budget = simpledialog.askinteger("Frame cache", "Memory for decoded frames (MB):",
+                                         initialvalue=self.browser.frame_cache.budget // 2 ** 20, minvalue=0)
+        if budget is not None:
+            self.browser.frame_cache.set_budget(budget * 2 ** 20)
+
+    def sync_live_preview(self, *args):
+        self.browser.live_preview = self.live_preview.get()
+
+    def sync_save_thumbnails(self, *args):
+        self.browser.save_thumbnails = self.save_thumbnails.get()
+
+    def save_session(self):
+        if self.browser.audio_data is None:
+            self.browser.view_nodata_error()
+            return
+        self.browser.model_save_session()
+
+    def remember_image(self):
+        if self.browser.audio_data is None:
+            self.browser.view_nodata_error()
+            return
+        self.browser.model_remember_image()
+
+    def forget_image(self):
+        if self.browser.audio_data is None:
+            self.browser.view_nodata_error()
+            return
+        self.browser.session.remove_frame(self.browser.offset)
+        self.browser.model_save_session()
+
+    def view_update_remembered(self):
+        '''Rebuilds the list of remembered images each time the menu is opened.'''
+        self.remembered_menu.delete(0, tk.END)
+        table = self.browser.session.frame_table() if self.browser.session is not None else []
+        if not table:
+            self.remembered_menu.add_command(label="(none)", state=tk.DISABLED)
+        for offset, parameters in table:
+            self.remembered_menu.add_command(
+                label="offset %d: SLW %s, NoS %s, adjust %s" % (offset, parameters["scan_line_width"],
+                                                               parameters["number_of_scans"], parameters["adjust"]),
+                command=lambda offset=offset, parameters=parameters:
+                    self.browser.view_apply_parameters(dict(parameters, offset=offset)))
+
+    def sync_profile_functions(self, *args):
+        self.browser.profiler.cprofile = self.profile_functions.get()
+
+    def sync_profile_memory(self, *args):
+        self.browser.profiler.set_memory(self.profile_memory.get())
+
+    def export_timings(self):
+        filename = tk.filedialog.asksaveasfilename(defaultextension=".jsonl",
+                                                   filetypes=(("JSON lines", "*.jsonl"), ))
+        if not filename:
+            return
+        try:
+            written = self.browser.profiler.export(filename)
+        except IOError as error:
+            messagebox.showerror("Export timings", "Error saving timings\n%s" % (error))
+            return
+        messagebox.showinfo("Export timings", "%d timings exported as %s" % (written, filename))
+
+    def clear_timings(self):
+        self.browser.profiler.clear()
+        self.browser.view_show_timings()
 
     def sync_flip_horizontal(self, *args):
         self.browser.flip_horizontal = self.flip_horizontal.get()
-        self.browser.imager.view_plot_image()
+        self.browser.view_schedule_replot()
 
     def model_init(self):
         self.invert_signal = tk.BooleanVar()
@@ -102,31 +243,64 @@ class FileMenu(object):
         self.flip_horizontal.set(False)
         self.flip_horizontal.trace("w", self.sync_flip_horizontal)
 
+        # * channel index of stereo files, -1 decodes both channels side by side
+        self.channel = tk.IntVar()
+        self.channel.set(0)
+        self.channel.trace("w", self.sync_channel)
+
+        # * empty string: lines at their nominal offsets, no alignment
+        self.align_mode = tk.StringVar()
+        self.align_mode.set("")
+        self.align_mode.trace("w", self.sync_align_mode)
+
+        self.interpolation = tk.StringVar()
+        self.interpolation.set("nearest")
+        self.interpolation.trace("w", self.sync_interpolation)
+
+        self.live_preview = tk.BooleanVar()
+        self.live_preview.set(False)
+        self.live_preview.trace("w", self.sync_live_preview)
+
+        self.export_normalization = tk.StringVar()
+        self.export_normalization.set("minmax")
+        self.export_bits = tk.IntVar()
+        self.export_bits.set(8)
+
+        self.save_thumbnails = tk.BooleanVar()
+        self.save_thumbnails.set(True)
+        self.save_thumbnails.trace("w", self.sync_save_thumbnails)
+
+        self.profile_functions = tk.BooleanVar()
+        self.profile_functions.set(self.browser.profiler.cprofile)
+        self.profile_functions.trace("w", self.sync_profile_functions)
+        self.profile_memory = tk.BooleanVar()
+        self.profile_memory.set(self.browser.profiler.memory)
+        self.profile_memory.trace("w", self.sync_profile_memory)
+
     def __save_image(self, resize=False):
         filename = tk.filedialog.asksaveasfilename(defaultextension=".bin")
-        if filename is None: # asksaveasfile return `None` if dialog closed with "cancel".
+        if not filename: # asksaveasfilename returns an empty string if dialog closed with "cancel".
             return
 
-        data = np.array(self.browser.imager.model_get_segment())
-        x1, x2 = np.min(data), np.max(data)
-        y1, y2 = 0, 255.0
-        m = (y2 - y1) / (x2 - x1)
-        b = y2 - (m * x2)
-        data_rescaled_colors = ((m * data) + b).astype(np.uint8)
-        image = Image.fromarray(data_rescaled_colors)
-        if resize:
-            image = image.resize((image.width, int(image.width * (4.0/ 3.0)) ))
-
         try:
-            image.save(filename)
-        except KeyError:
+            with self.browser.profiler.stage("export", file=filename):
+                image = to_image(self.browser.imager.model_get_segment(), resize,
+                                 self.export_normalization.get(), self.export_bits.get())
+                image.save(filename)
+        except (KeyError, ValueError):
             messagebox.showerror("Export image", "Invalid image format.\nTry using file extensions like .png or .jpg")
             return
         except IOError:
+            # * Pillow refuses to write 16 bit gray levels in most formats (e.g. "cannot write mode I;16 as JPEG")
+            if self.export_bits.get() == 16 and os.path.splitext(filename)[1].lower() not in EXPORT_16_BITS:
+                messagebox.showerror("Export image", "16 bits per pixel images can only be saved as PNG or TIFF.\n"
+                                     "Use a .png or .tif file extension, or export with 8 bits per pixel")
+                return
             messagebox.showerror("Export image",
                                  "Error saving image.\nCheck that you have enough disk space\nor right privileges")
             return
 
+        self.browser.view_show_timings()
         messagebox.showinfo("Export image", "Image exported as %s" % (filename))
 
     def save_image_raw_size(self):
@@ -134,6 +308,90 @@ class FileMenu(object):
 
     def save_image_resized(self):
         self.__save_image(resize=True)
+
+    def save_image_stack(self):
+        if self.browser.audio_data is None:
+            self.browser.view_nodata_error()
+            return
+
+        count = simpledialog.askinteger("Export images", "Number of consecutive images to export:",
+                                        initialvalue=10, minvalue=1)
+        if count is None:
+            return
+        filename = tk.filedialog.asksaveasfilename(defaultextension=".tif",
+                                                   filetypes=(("TIFF stack", "*.tif *.tiff"), ))
+        if not filename:
+            return
+
+        imager = self.browser.imager
+        key = imager.model_segment_key()
+        offsets = frame_offsets(len(self.browser.audio_data), key[0], key[1], key[2], key[3])[:count]
+
+        def export(audio_data):
+            # * the pages use the 3:4 ratio of "Export image...", as the color export does
+            with FrameWriter(filename, stack=True, resize=True, method=self.export_normalization.get(),
+                             bits=self.export_bits.get()) as writer:
+                for offset in offsets:
+                    writer.write(imager.model_decode(audio_data, (offset, ) + key[1:])[0])
+            return writer.count
+
+        self.browser.root.config(cursor="watch")
+        self.browser.worker.submit("export", self.browser.profiler.wrap("export", export, file=filename, frames=count),
+                                   (self.browser.audio_data, ),
+                                   lambda written: self.view_stack_exported(filename, written),
+                                   self.browser.view_worker_error)
+
+    def view_stack_exported(self, filename, written):
+        self.browser.root.config(cursor="")
+        self.browser.view_show_timings()
+        messagebox.showinfo("Export images", "%d images exported as %s" % (written, filename))
+
+    def save_color_image(self):
+        if self.browser.audio_data is None:
+            self.browser.view_nodata_error()
+            return
+
+        order = simpledialog.askstring("Export color image", "Color order of the three consecutive images:",
+                                       initialvalue="RGB")
+        if order is None:
+            return
+        order = order.strip().upper()
+        if sorted(order) != ["B", "G", "R"]:
+            messagebox.showerror("Export color image", "The color order must be a permutation of RGB")
+            return
+        filename = tk.filedialog.asksaveasfilename(defaultextension=".png")
+        if not filename:
+            return
+
+        self.browser.model_request_frame_index(lambda frames: self.model_export_color(frames, order, filename))
+
+    def model_export_color(self, frames, order, filename):
+        # * the current image and the next two in the frame index; if the index
+        # * does not hold them, assume the frames follow each other back to back
+        key = self.browser.imager.model_segment_key()
+        position = bisect.bisect_left(frames, key[0])
+        offsets = frames[position:position + 3]
+        if len(offsets) < 3 or offsets[0] != key[0]:
+            offsets = None
+
+        def export(audio_data):
+            rgb, shifts = color_frame(audio_data, key[0], key[1], key[2], key[3], key[4], key[5], key[6],
+                                      offsets, order)
+            to_color_image(rgb, True, self.export_normalization.get()).save(filename)
+            return shifts
+
+        self.browser.root.config(cursor="watch")
+        self.browser.worker.submit("export", self.browser.profiler.wrap("export", export, file=filename, frames=3),
+                                   (self.browser.audio_data, ),
+                                   lambda shifts: self.view_color_exported(filename, shifts),
+                                   self.browser.view_worker_error)
+
+    def view_color_exported(self, filename, shifts):
+        self.browser.root.config(cursor="")
+        self.browser.view_show_timings()
+        messagebox.showinfo("Export color image", "Color image exported as %s\n\nChannel shifts (lines, samples):\n%s"
+                            % (filename, "\n".join("%s: %+.2f, %+.2f" % ((color, ) + tuple(shift))
+                                                   for color, shift in zip("RGB", shifts))))
         
     def about(self):
         '''Starts project webpage in the default system's web browser'''
@@ -159,6 +417,18 @@ class FileMenu(object):
         filemenu.add_separator()
         filemenu.add_command(label="Export image...", command=self.save_image_resized)
         filemenu.add_command(label="Export image (raw size)...", command=self.save_image_raw_size)
+        filemenu.add_command(label="Export images (TIFF stack)...", command=self.save_image_stack)
+        filemenu.add_command(label="Export color image...", command=self.save_color_image)
+        exportmenu = tk.Menu(filemenu, tearoff=0)
+        exportmenu.add_radiobutton(label="Contrast: min/max", value="minmax", variable=self.export_normalization)
+        exportmenu.add_radiobutton(label="Contrast: 0.5-99.5 percentiles", value="percentile",
+                                   variable=self.export_normalization)
+        exportmenu.add_radiobutton(label="Contrast: histogram equalization", value="equalize",
+                                   variable=self.export_normalization)
+        exportmenu.add_separator()
+        exportmenu.add_radiobutton(label="8 bits per pixel", value=8, variable=self.export_bits)
+        exportmenu.add_radiobutton(label="16 bits per pixel (png, tiff)", value=16, variable=self.export_bits)
+        filemenu.add_cascade(label="Export options", menu=exportmenu)
         filemenu.add_separator()
         filemenu.add_command(label="Exit", command=parent.root.quit)
         menubar.add_cascade(label="File", menu=filemenu)
@@ -166,8 +436,46 @@ class FileMenu(object):
         filemenu = tk.Menu(menubar, tearoff=0)
         filemenu.add_checkbutton(label="Invert audio signal", onvalue=True, offvalue=False, variable=self.invert_signal)
         filemenu.add_checkbutton(label="Flip horizontal", onvalue=True, offvalue=False, variable=self.flip_horizontal)
+        filemenu.add_separator()
+        filemenu.add_radiobutton(label="Left channel", value=0, variable=self.channel)
+        filemenu.add_radiobutton(label="Right channel", value=1, variable=self.channel)
+        filemenu.add_radiobutton(label="Both channels (side by side)", value=-1, variable=self.channel)
+        filemenu.add_separator()
+        filemenu.add_radiobutton(label="No line alignment", value="", variable=self.align_mode)
+        filemenu.add_radiobutton(label="Align lines to sync pulse", value="sync", variable=self.align_mode)
+        filemenu.add_radiobutton(label="Align lines to previous line", value="previous", variable=self.align_mode)
+        filemenu.add_separator()
+        filemenu.add_radiobutton(label="Resampling: none (truncate offsets)", value="nearest", variable=self.interpolation)
+        filemenu.add_radiobutton(label="Resampling: linear", value="linear", variable=self.interpolation)
+        filemenu.add_radiobutton(label="Resampling: cubic", value="cubic", variable=self.interpolation)
+        filemenu.add_radiobutton(label="Resampling: windowed sinc", value="sinc", variable=self.interpolation)
+        filemenu.add_separator()
+        filemenu.add_checkbutton(label="Live preview while typing", onvalue=True, offvalue=False,
+                                 variable=self.live_preview)
+        filemenu.add_command(label="Frame cache size...", command=self.set_cache_size)
         menubar.add_cascade(label="Image", menu=filemenu)
         
+        filemenu = tk.Menu(menubar, tearoff=0)
+        filemenu.add_command(label="Save session", command=self.save_session)
+        filemenu.add_checkbutton(label="Save thumbnails in sessions", onvalue=True, offvalue=False,
+                                 variable=self.save_thumbnails)
+        filemenu.add_separator()
+        filemenu.add_command(label="Remember this image", command=self.remember_image)
+        filemenu.add_command(label="Forget this image", command=self.forget_image)
+        self.remembered_menu = tk.Menu(filemenu, tearoff=0, postcommand=self.view_update_remembered)
+        filemenu.add_cascade(label="Remembered images", menu=self.remembered_menu)
+        menubar.add_cascade(label="Session", menu=filemenu)
+
+        filemenu = tk.Menu(menubar, tearoff=0)
+        filemenu.add_checkbutton(label="Profile functions (cProfile)", onvalue=True, offvalue=False,
+                                 variable=self.profile_functions)
+        filemenu.add_checkbutton(label="Profile memory (tracemalloc)", onvalue=True, offvalue=False,
+                                 variable=self.profile_memory)
+        filemenu.add_separator()
+        filemenu.add_command(label="Export timings (JSON lines)...", command=self.export_timings)
+        filemenu.add_command(label="Clear timings", command=self.clear_timings)
+        menubar.add_cascade(label="Profile", menu=filemenu)
+
         filemenu = tk.Menu(menubar, tearoff=0)
         filemenu.add_command(label="About...", command=self.about)
         menubar.add_cascade(label="Help", menu=filemenu)
@@ -175,32 +483,173 @@ class FileMenu(object):
         parent.root.config(menu=menubar)
 
 
+class OverviewStrip(object):
+    '''Envelope of the whole recording. Click to jump there, wheel to zoom, right click to zoom out.'''
+
+    def model_init(self):
+        self.pyramid = None
+        self.view_start = 0
+        self.view_stop = 0
+
+    def model_set_pyramid(self, pyramid):
+        self.pyramid = pyramid
+        self.view_start, self.view_stop = 0, pyramid.length
+        self.view_draw()
+
+    def model_sample_at(self, x):
+        width = max(self.canvas.winfo_width(), 1)
+        return int(self.view_start + float(x) / width * (self.view_stop - self.view_start))
+
+    def view_on_click(self, event):
+        if self.pyramid is None:
+            return
+        offset = min(max(self.model_sample_at(event.x), 0), self.pyramid.length - 1)
+        self.browser.controlwidgets.offset.offset_entry.textvariable.set(offset)
+        self.browser.view_replot_now()
+
+    def view_on_zoom(self, event):
+        if self.pyramid is None:
+            return
+        width = max(self.canvas.winfo_width(), 1)
+        zoom_in = event.num == 4 or getattr(event, "delta", 0) > 0
+        span = self.view_stop - self.view_start
+        span = span // 2 if zoom_in else span * 2
+        # * at most one sample per pixel, at least the whole recording
+        span = min(max(span, width), self.pyramid.length)
+        fraction = float(event.x) / width
+        start = self.model_sample_at(event.x) - int(fraction * span)
+        self.view_start = min(max(start, 0), self.pyramid.length - span)
+        self.view_stop = self.view_start + span
+        self.view_draw()
+
+    def view_on_reset(self, event):
+        if self.pyramid is not None:
+            self.view_start, self.view_stop = 0, self.pyramid.length
+            self.view_draw()
+
+    def view_draw(self, *args):
+        self.canvas.delete("all")
+        if self.pyramid is None:
+            return
+
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        mins, maxs, rms = self.pyramid.envelope(self.view_start, self.view_stop, width)
+        if len(mins) == 0:
+            return
+        top = self.pyramid.levels[-1]
+        peak = max(abs(float(top[0].min())), abs(float(top[1].max())), 1e-12)
+        middle, scale = height / 2.0, (height / 2.0 - 1) / peak
+
+        # * the envelopes are drawn as two polygons: the cost depends on the pixels only
+        x = np.arange(len(mins))
+        for upper, lower, color in ((maxs, mins, "#808080"), (rms, -rms, "#303030")):
+            points = np.empty((2 * len(x), 2))
+            points[:len(x), 0], points[:len(x), 1] = x, middle - upper * scale
+            points[len(x):, 0], points[len(x):, 1] = x[::-1], (middle - lower * scale)[::-1]
+            self.canvas.create_polygon(*points.ravel(), fill=color, outline=color)
+
+        self.view_draw_marker()
+
+    def view_draw_marker(self):
+        self.canvas.delete("marker")
+        if self.pyramid is None or self.view_stop <= self.view_start:
+            return
+
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        samples_per_pixel = float(self.view_stop - self.view_start) / max(width, 1)
+        if self.browser.frame_index:
+            for frame in self.browser.frame_index:
+                if self.view_start <= frame < self.view_stop:
+                    x = (frame - self.view_start) / samples_per_pixel
+                    self.canvas.create_line(x, 0, x, 6, fill="#0050c0", tags="marker")
+
+        frame_span = self.browser.number_of_scans * (self.browser.scan_line_width + self.browser.adjust)
+        x1 = (self.browser.offset - self.view_start) / samples_per_pixel
+        x2 = (self.browser.offset + frame_span - self.view_start) / samples_per_pixel
+        self.canvas.create_rectangle(x1, 1, max(x2, x1 + 2), height - 1, outline="#940015", width=2, tags="marker")
+
+    def __init__(self, parent, master):
+        self.browser = parent
+        self.model_init()
+        self.canvas = tk.Canvas(master, height=60, background="white", highlightthickness=0)
+        self.canvas.bind("<Configure>", self.view_draw)
+        self.canvas.bind("<Button-1>", self.view_on_click)
+        self.canvas.bind("<Button-3>", self.view_on_reset)
+        self.canvas.bind("<MouseWheel>", self.view_on_zoom)
+        self.canvas.bind("<Button-4>", self.view_on_zoom)
+        self.canvas.bind("<Button-5>", self.view_on_zoom)
+        self.canvas.pack(side=tk.TOP, fill=tk.X, padx=2, pady=2)
+
+
 class Imager(object):
 
     def model_init(self):
         self.first = True
-        pass
+        self.line_starts = None
+        self.image_data = None
+        self.image_step = 1
+        # * segment key of the displayed image, None for previews and thumbnails
+        self.image_key = None
+        self.image_artist = None
+        self.scanline_marker = None
+        self.waveform = None
+        self.background = None
+
+    def model_segment_key(self):
+        return (
+            self.browser.offset,
+            self.browser.scan_line_width,
+            self.browser.number_of_scans,
+            self.browser.adjust,
+            self.browser.invert_signal,
+            self.browser.channel,
+            self.browser.interpolation,
+            self.browser.align_mode
+        )
 
-    def model_get_segment(self):
-        offset = self.browser.offset 
-        scan_width = self.browser.scan_line_width
-        image_data = []
-        offset_exceeded = False
-
-        for scan in range(self.browser.number_of_scans):
-            chunk = [-_m if self.browser.invert_signal
-                     else _m for _m in self.browser.audio_data[int(offset):int(offset) + scan_width]]
-            if len(chunk) != scan_width:
-                chunk = np.zeros(scan_width)
-                offset_exceeded = True
-            image_data.append(chunk)
-            offset += scan_width + self.browser.adjust
-
-        if offset_exceeded:
-            self.browser.offset_exceeded = True
-        else:
-            self.browser.offset_exceeded = False
+    @staticmethod
+    def model_key_parameters(key):
+        '''Parameters of a segment key, as stored in sessions.'''
+        return {
+            "scan_line_width": key[1],
+            "number_of_scans": key[2],
+            "adjust": key[3],
+            "invert_signal": key[4],
+            "channel": key[5],
+            "interpolation": key[6],
+            "align_mode": key[7]
+        }
+
+    @staticmethod
+    def model_decode(audio_data, key):
+        '''Decodes the frame described by a segment key, returns (image, line starts, offset exceeded).'''
+        arguments = key[:6]
+        interpolation, align_mode = key[6:]
+        if align_mode is None:
+            image_data, offset_exceeded = get_segment(audio_data, *arguments, interpolation=interpolation)
+            return image_data, None, offset_exceeded
+        return align_segment(audio_data, *arguments, mode=align_mode)
+
+    @staticmethod
+    def model_decode_preview(audio_data, key, step):
+        '''Decodes every `step`-th line and column of the frame described by a segment key.'''
+        offset, scan_line_width, number_of_scans, adjust, invert_signal, channel = key[:6]
+        starts = line_starts(offset, scan_line_width, number_of_scans, adjust)[::step]
+        image_data, valid = gather_lines(audio_data, starts, scan_line_width, channel)
+        image_data = np.ascontiguousarray(image_data[:, ::step])
+        if invert_signal:
+            np.negative(image_data, out=image_data)
+        return image_data, None, not valid.all()
 
+    def model_get_segment(self):
+        key = self.model_segment_key()
+        cached = self.browser.frame_cache.get(key)
+        if cached is None:
+            with self.browser.profiler.stage("decode", key=list(key)):
+                decoded = self.model_decode(self.browser.audio_data, key)
+            cached = self.browser.frame_cache.put(key, decoded)
+
+        image_data, self.line_starts, self.browser.offset_exceeded = cached
         return image_data
 
     def view_plot_image(self):
@@ -211,43 +660,150 @@ class Imager(object):
                 self.browser.view_nodata_error()
             return
 
+        self.browser.worker.cancel("preview")
+        key = self.model_segment_key()
+        cached = self.browser.frame_cache.get(key)
+        if cached is not None:
+            # * a decode still running for older parameters must not draw over this frame
+            self.browser.worker.cancel("decode")
+            self.browser.root.config(cursor="")
+            self.view_render(cached, key=key)
+            return
+
+        # * decode in the background; a newer request drops this one
         self.browser.root.config(cursor="watch")
-        self.browser.root.update()
-        image_data = self.model_get_segment()
+        self.browser.worker.submit("decode", self.browser.profiler.wrap("decode", self.model_decode, key=list(key)),
+                                   (self.browser.audio_data, key),
+                                   lambda result: self.view_on_decoded(key, result),
+                                   self.browser.view_worker_error)
+
+    def view_plot_preview(self, step=4):
+        '''Renders a decimated preview of the frame, cheap enough to follow the typing.'''
+        if self.browser.audio_data is None:
+            return
+        self.browser.worker.submit("preview", self.browser.profiler.wrap("preview", self.model_decode_preview),
+                                   (self.browser.audio_data, self.model_segment_key(), step),
+                                   lambda result: self.view_render(result, step), self.browser.view_worker_error)
+
+    def view_on_decoded(self, key, result):
+        self.view_render(self.browser.frame_cache.put(key, result), key=key)
+
+    def view_render(self, decoded, step=1, key=None):
+        '''Shows a decoded frame; `key` is its segment key, if it is the fully decoded frame.'''
+        image_data, self.line_starts, self.browser.offset_exceeded = decoded
 
         if not self.browser.offset_exceeded:
-            self.ax1.clear()
-            self.ax2.clear()
-            self.ax1.set_xlim([self.browser.scan_line_width, 0]
-                              if self.browser.flip_horizontal else [0, self.browser.scan_line_width])
-            self.ax1.set_ylim([self.browser.number_of_scans, 0])
-            self.ax1.imshow(image_data, aspect='auto', cmap='gray')
-            self.ax1.plot([0, self.browser.scan_line_width], [self.browser.plot_scanline, self.browser.plot_scanline])
-
-            self.ax2.set_xlim([self.browser.scan_line_width, 0]
-                              if self.browser.flip_horizontal else [0, self.browser.scan_line_width])
-            self.ax2.set_ylim([-0.5, 0.5])
-            self.ax2.set_xlabel("Offset (relative)")
-            self.ax2.set_ylabel("signal")
-            self.ax2.plot(range(len(image_data[self.browser.plot_scanline])), image_data[self.browser.plot_scanline])
-            if self.mpltlib3:
-                self.canvas.draw()
+            self.view_update_artists(image_data, step)
+            self.image_key = key
+            with self.browser.profiler.stage("draw"):
+                self.view_draw()
+            self.overview.view_draw_marker()
+            self.browser.view_show_timings()
+        elif step == 1:
+            self.browser.view_offset_exceeded_error()
+
+        if step == 1:
+            self.browser.root.config(cursor="")
+
+    def view_update_artists(self, image_data, step):
+        self.view_init_figure()
+        with self.browser.profiler.stage("render"):
+            self.image_data = image_data
+            self.image_step = step
+            # * previews hold every `step`-th sample, but are drawn at full scale
+            image_height = self.browser.number_of_scans if step > 1 else image_data.shape[0]
+            image_width = image_data.shape[1] * step
+            xlim = [image_width, 0] if self.browser.flip_horizontal else [0, image_width]
+
+            # * the artists are created once and then only their data is updated
+            if self.image_artist is None:
+                self.image_artist = self.ax1.imshow(image_data, aspect='auto', cmap='gray')
+                self.scanline_marker, = self.ax1.plot([0, image_width], [0, 0], animated=True)
+                self.ax2.set_ylim([-1.0, 1.0])
+                self.ax2.set_xlabel("Offset (relative)")
+                self.ax2.set_ylabel("signal")
+                self.waveform, = self.ax2.plot([], [], animated=True)
+                self.ax2.callbacks.connect("xlim_changed", self.model_update_waveform)
             else:
-                self.canvas.show()
+                self.image_artist.set_data(image_data)
+            self.image_artist.set_clim(image_data.min(), image_data.max())
+            self.image_artist.set_extent((-0.5, image_width - 0.5, image_height - 0.5, -0.5))
+            self.ax1.set_xlim(xlim)
+            self.ax1.set_ylim([image_height, 0])
+            self.ax2.set_xlim(xlim)
+            self.scanline_marker.set_xdata([0, image_width])
+            self.model_update_scanline()
+
+    def model_update_scanline(self):
+        row = min(max(self.browser.plot_scanline // self.image_step, 0), self.image_data.shape[0] - 1)
+        scanline = row * self.image_step
+        self.scanline_marker.set_ydata([scanline, scanline])
+        self.model_update_waveform()
+
+    def model_update_waveform(self, *args):
+        '''Plots the visible span of the scanline reduced to min/max pairs per pixel; called on zoom too.'''
+        if self.image_data is None or self.waveform is None:
+            return
+        row = min(max(self.browser.plot_scanline // self.image_step, 0), self.image_data.shape[0] - 1)
+        line = self.image_data[row]
+        xmin, xmax = sorted(self.ax2.get_xlim())
+        lo = min(max(int(xmin // self.image_step), 0), len(line))
+        hi = min(max(int(np.ceil(xmax / self.image_step)) + 1, lo), len(line))
+        x, y = minmax_decimate(line[lo:hi], self.ax2.bbox.width)
+        self.waveform.set_data((x + lo) * self.image_step, y)
+
+    def view_update_scanline(self):
+        '''Moves the scanline marker and redraws the waveform by blitting, without a full redraw.'''
+        if self.image_artist is None or self.background is None:
+            return
+        self.model_update_scanline()
+        self.canvas.restore_region(self.background)
+        self.view_draw_animated()
+        self.canvas.blit(self.figure.bbox)
+
+    def view_draw_animated(self):
+        self.ax1.draw_artist(self.scanline_marker)
+        self.ax2.draw_artist(self.waveform)
+
+    def view_on_draw(self, event):
+        # * every full redraw (replot, resize, zoom) renders the figure without
+        # * the animated artists: save it as the background to blit them onto
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        if self.image_artist is not None:
+            self.view_draw_animated()
+
+    def view_draw(self):
+        if self.mpltlib3:
+            self.canvas.draw()
         else:
-            self.browser.view_offset_exceeded_error()
+            self.canvas.show()
 
-        self.browser.root.config(cursor="")
+    def view_init_figure(self):
+        '''Imports matplotlib and builds the figure, the first time an image is about to be shown.'''
+        if self.figure is not None:
+            return
 
-    def view_init(self):
-        self.frame = tk.LabelFrame(self.browser.workframe, text=" Image ")
-        self.frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=7, pady=7)
-        self.figure = plt.figure(figsize=(8, 12), dpi=70)
-        self.ax1 = plt.subplot2grid((50,40), (0, 0), rowspan=40, colspan=40)
-        self.ax2 = plt.subplot2grid((50,40), (42, 0), rowspan=8, colspan=40, sharex=self.ax1)
-        plt.subplots_adjust(left=0.1, bottom=0.05, right=0.95, top=0.97, wspace=0.2, hspace=0.2)
-        self.view_plot_image()
+        start = time.perf_counter()
+        import matplotlib
+        matplotlib.use("TkAgg")
+        from matplotlib.figure import Figure
+        from matplotlib.gridspec import GridSpec
+        # * support for previous matplotlib versions (v1, v2) and the current v3
+        if self.mpltlib3 is None:
+            self.mpltlib3 = int(matplotlib.__version__.split('.')[0]) > 2
+        if self.mpltlib3:
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+        else:
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2TkAgg
+
+        self.placeholder.destroy()
+        self.figure = Figure(figsize=(8, 12), dpi=70)
+        grid = GridSpec(50, 40)
+        self.ax1 = self.figure.add_subplot(grid[0:40, 0:40])
+        self.ax2 = self.figure.add_subplot(grid[42:50, 0:40], sharex=self.ax1)
+        self.figure.subplots_adjust(left=0.1, bottom=0.05, right=0.95, top=0.97, wspace=0.2, hspace=0.2)
         self.canvas = FigureCanvasTkAgg(self.figure, self.frame)
+        self.canvas.mpl_connect("draw_event", self.view_on_draw)
 
         if self.mpltlib3:
             self.canvas.draw()
@@ -259,10 +815,21 @@ class Imager(object):
         self.canvas.get_tk_widget().pack(side=tk.BOTTOM, fill=tk.BOTH, expand=True)
 
         self.canvas._tkcanvas.pack(side=tk.TOP, fill=tk.BOTH, padx=2, pady=2, expand=True)
+        self.browser.profiler.record("figure", time.perf_counter() - start)
+
+    def view_init(self):
+        self.frame = tk.LabelFrame(self.browser.workframe, text=" Image ")
         self.frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=7, pady=7)
+        self.overview = OverviewStrip(self.browser, self.frame)
+        # * about the size of the figure (8 x 12 inches at 70 dpi), so the window keeps its size when it appears
+        self.placeholder = tk.Label(self.frame, text="Open a .wav file to browse its images\n(File -> Open WAV...)",
+                                    width=8 * 70 // 7, height=12 * 70 // 15)
+        self.placeholder.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.view_plot_image()
 
-    def __init__(self, parent, mpltlib3=True):
+    def __init__(self, parent, mpltlib3=None):
         self.mpltlib3 = mpltlib3
+        self.figure = None
         self.browser = parent
         self.model_init()
         self.view_init()
@@ -310,11 +877,46 @@ class OffsetControl(object):
                     self.browser.offset = maxsize
                     self.offset_entry.textvariable.set(maxsize)
 
-                self.browser.imager.view_plot_image()
+                self.browser.view_replot_now()
 
             else:
                 self.browser.view_nodata_error()
 
+        def model_jump_to_image(self, direction):
+            if self.browser.audio_data is None:
+                self.browser.view_nodata_error()
+                return
+
+            self.browser.model_request_frame_index(lambda frames: self.model_jump_in_index(frames, direction))
+
+        def model_jump_in_index(self, frames, direction):
+            if direction > 0:
+                position = bisect.bisect_right(frames, self.browser.offset)
+                target = frames[position] if position < len(frames) else None
+            else:
+                position = bisect.bisect_left(frames, self.browser.offset)
+                target = frames[position - 1] if position > 0 else None
+
+            if target is None:
+                print("No more images found in this direction")
+                return
+
+            # * images tuned earlier come back with their own parameters
+            tuned = self.browser.session.frames.get(target) if self.browser.session is not None else None
+            if tuned is not None:
+                self.browser.view_apply_parameters(dict(tuned, offset=target))
+                return
+
+            self.browser.offset = target
+            self.offset_entry.textvariable.set(target)
+            self.browser.view_replot_now()
+
+        def model_next_image(self):
+            self.model_jump_to_image(+1)
+
+        def model_previous_image(self):
+            self.model_jump_to_image(-1)
+
         def model_increment_offset(self):
             self.model_modify_offset("+")
 
@@ -336,6 +938,7 @@ class OffsetControl(object):
                     self.offset_entry.textvariable.set(str(maxsize))
                 else:
                     self.browser.offset = textvariable_as_int
+                self.browser.view_schedule_replot()
             else:
                 print("No audio data in memory!!")
 
@@ -355,6 +958,10 @@ class OffsetControl(object):
             tk.Button(ftop, text="sub", width=1, command=self.model_decrement_offset).pack(side=tk.LEFT)
             tk.Button(ftop, text="add", width=1, command=self.model_increment_offset).pack(side=tk.LEFT)
 
+            fimage = tk.Frame(self.frame)
+            tk.Button(fimage, text="previous image", command=self.model_previous_image).pack(side=tk.LEFT, fill=tk.X, expand=True)
+            tk.Button(fimage, text="next image", command=self.model_next_image).pack(side=tk.LEFT, fill=tk.X, expand=True)
+
             _mm = tk.Frame(fbottom)
 
             for radiobutrow in [["1000", "100", "10", "1"], ["NoS x SLW", "100 x SLW", "10 x SLW", "1 x SLW"]]:
@@ -376,6 +983,7 @@ class OffsetControl(object):
 
             ftop.pack(side=tk.TOP, fill=tk.BOTH,  padx=4, pady=4, expand=True)
             fbottom.pack(side=tk.TOP, fill=tk.BOTH,  padx=4, pady=4, expand=True)
+            fimage.pack(side=tk.TOP, fill=tk.BOTH,  padx=4, pady=4, expand=True)
             self.frame.pack(side=tk.TOP, fill=tk.X, padx=7, pady=7, expand=False)
 
 
@@ -396,6 +1004,22 @@ class ScanLineWidthControl(object):
         newvalue = self.scan_line_width_entry.textvariable_as_int() - 1
         self.scan_line_width_entry.textvariable.set(str(newvalue))
 
+    def model_estimate(self):
+        if self.browser.audio_data is None:
+            self.browser.view_nodata_error()
+            return
+
+        period = estimate_scan_line_width(self.browser.audio_data, self.browser.offset,
+                                          self.browser.scan_line_width, channel=self.browser.channel)
+        if period is None:
+            self.browser.view_offset_exceeded_error()
+            return
+
+        scan_line_width, adjust = split_period(period)
+        self.scan_line_width_entry.textvariable.set(str(scan_line_width))
+        self.parent.adjust.adjust_control_entry.textvariable.set("%2.3f" % (adjust))
+        self.browser.view_replot_now()
+
     def model_sync_with_entry(self, *args):
         if self.browser.audio_data is not None:
             textvariable_as_int = self.scan_line_width_entry.textvariable_as_int()
@@ -406,6 +1030,7 @@ class ScanLineWidthControl(object):
                 self.scan_line_width_entry.textvariable.set(0)
             else:
                self.browser.scan_line_width = textvariable_as_int
+            self.browser.view_schedule_replot()
 
     def __init__(self, parent):
         self.parent = parent
@@ -417,6 +1042,7 @@ class ScanLineWidthControl(object):
         self.scan_line_width_entry.Entry.pack(side=tk.LEFT, fill=tk.X, padx=4, pady=4, expand=True)
         tk.Button(self.frame, text="-", command=self.model_decrease).pack(side=tk.LEFT)
         tk.Button(self.frame, text="+", command=self.model_increase).pack(side=tk.LEFT)
+        tk.Button(self.frame, text="auto", command=self.model_estimate).pack(side=tk.LEFT)
         self.frame.pack(side=tk.TOP, fill=tk.X, padx=7, pady=7, expand=False)
 
 
@@ -440,6 +1066,7 @@ class NumberOfScansControl(object):
                 self.number_of_scans_entry.textvariable.set(0)
             else:
                self.browser.number_of_scans = textvariable_as_int
+            self.browser.view_schedule_replot()
 
     def __init__(self, parent):
         self.parent = parent
@@ -463,12 +1090,49 @@ class AdjustControl(object):
         newvalue = self.adjust_control_entry.textvariable_as_float() - 0.01
         self.adjust_control_entry.textvariable.set("%2.3f" % (newvalue))
 
+    def model_search(self):
+        '''Searches the SLW and adjust that line up the scan lines of the displayed image best, in the background.'''
+        if self.browser.audio_data is None:
+            self.browser.view_nodata_error()
+            return
+
+        browser = self.browser
+        channel = 0 if browser.channel is None else browser.channel
+        arguments = (browser.offset, browser.scan_line_width, browser.number_of_scans, browser.adjust, channel)
+
+        def search(audio_data):
+            current = line_coherence(get_segment(audio_data, *arguments[:4], channel=channel)[0])
+            return search_line_period(audio_data, *arguments), current
+
+        browser.root.config(cursor="watch")
+        browser.worker.submit("search", browser.profiler.wrap("search", search), (browser.audio_data, ),
+                              self.view_offer_search, browser.view_worker_error)
+
+    def view_offer_search(self, result):
+        self.browser.root.config(cursor="")
+        self.browser.view_show_timings()
+        found, current = result
+        if found is None:
+            self.browser.view_offset_exceeded_error()
+            return
+
+        period, score = found
+        scan_line_width, adjust = split_period(period)
+        if messagebox.askyesno("Search SLW and adjust",
+                               "Best line period: %.3f samples\nSLW %d, adjust %2.3f\n\n"
+                               "Alignment score %.3f (current values: %.3f)\n\nUse these values?"
+                               % (period, scan_line_width, adjust, score, current)):
+            self.parent.scansize.scan_line_width_entry.textvariable.set(str(scan_line_width))
+            self.adjust_control_entry.textvariable.set("%2.3f" % (adjust))
+            self.browser.view_replot_now()
+
     def model_sync_with_entry(self, *args):
         if self.browser.audio_data is not None:
             textvariable_as_float = self.adjust_control_entry.textvariable_as_float()
             if textvariable_as_float is None:
                 return
             self.browser.adjust = textvariable_as_float
+            self.browser.view_schedule_replot()
 
     def __init__(self, parent):
         self.parent = parent
@@ -480,6 +1144,7 @@ class AdjustControl(object):
         self.adjust_control_entry.Entry.pack(side=tk.LEFT, fill=tk.X, padx=4, pady=4, expand=True)
         tk.Button(self.frame, text="-", command=self.model_decrease).pack(side=tk.LEFT)
         tk.Button(self.frame, text="+", command=self.model_increase).pack(side=tk.LEFT)
+        tk.Button(self.frame, text="search", command=self.model_search).pack(side=tk.LEFT)
         self.frame.pack(side=tk.TOP, fill=tk.X, padx=7, pady=7, expand=False)
 
 
@@ -493,6 +1158,7 @@ class ScanlinePlotSliderControl(object):
 
     def model_sync_with_entry(self, v):
         self.browser.plot_scanline = int(v)
+        self.browser.imager.view_update_scanline()
 
     def model_slide_range_update(self, *args):
         newmax = self.parent.numberofscans.number_of_scans_entry.textvariable_as_int()
@@ -524,7 +1190,7 @@ class ControlWidgets(object):
         self.scanlineplot =  ScanlinePlotSliderControl(self)
         self.offset = OffsetControl(self)
         self.plotbutton = tk.Button(self.frame, text="REPLOT", height=3,
-                                    command=self.browser.imager.view_plot_image, relief=tk.GROOVE, borderwidth=4)
+                                    command=self.browser.view_replot_now, relief=tk.GROOVE, borderwidth=4)
         self.plotbutton.pack(side=tk.TOP, fill=tk.X, padx=4, pady=4, expand=False)
         self.frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
@@ -533,12 +1199,86 @@ class VoyagerBrowser(object):
 
     def model_load_audio_data(self, filename):
         self.root.config(cursor="watch")
-        self.root.update()
-        self.rate, self.audio_data = scipy.io.wavfile.read(filename)
+        # * build the figure while the file loads in the background
+        self.root.after_idle(self.imager.view_init_figure)
+        self.worker.submit("load", self.profiler.wrap("load", load_wav, file=filename), (filename,),
+                           lambda result: self.model_on_audio_loaded(filename, result), self.view_load_error)
+
+    def model_on_audio_loaded(self, filename, result):
+        self.model_save_session()
+        # * the displayed image belongs to the previous file
+        self.imager.image_key = None
+        self.rate, self.audio_data = result
+        self.filename = filename
+        self.frame_index = None
+        # * an index still being built belongs to the previous file
+        self.index_worker.cancel("index")
+        self.frame_cache.clear()
         self.root.config(cursor="")
+        self.view_show_timings()
+        self.session = Session.load(filename)
+        if self.session is None:
+            self.session = Session()
+            self.imager.view_plot_image()
+        else:
+            self.view_apply_parameters(self.session.parameters)
+        overview_channel = 0 if self.channel is None else self.channel
+        self.overview_worker.submit("overview", self.profiler.wrap("overview", envelope_pyramid), (filename, self.audio_data, overview_channel),
+                                    self.imager.overview.model_set_pyramid, self.view_worker_error)
+
+    def model_request_frame_index(self, callback):
+        '''Calls `callback` with the frame index of the current file, building it in the background if needed.'''
+        parameters = (self.scan_line_width, self.number_of_scans, self.adjust, self.channel)
+        if self.frame_index is not None and self.frame_index_parameters == parameters:
+            callback(self.frame_index)
+            return
+
+        def on_frame_index(frames):
+            self.frame_index = frames
+            self.frame_index_parameters = parameters
+            self.root.config(cursor="")
+            callback(frames)
+
+        self.root.config(cursor="watch")
+        self.index_worker.submit("index", self.profiler.wrap("index", frame_index),
+                                 (self.filename, self.audio_data) + parameters, on_frame_index, self.view_worker_error)
+
+    def model_decode_parameters(self):
+        '''Parameters that decode the image at the current offset, as stored in sessions.'''
+        return self.imager.model_key_parameters(self.imager.model_segment_key())
+
+    def model_parameters(self):
+        return dict(self.model_decode_parameters(), offset=self.offset, flip_horizontal=self.flip_horizontal,
+                    plot_scanline=self.plot_scanline)
+
+    def model_save_session(self):
+        if self.session is None or self.filename is None:
+            return
+        self.session.parameters = self.model_parameters()
+        imager = self.imager
+        # * the parameters may have changed since the displayed image was decoded: it is
+        # * stored under the key it was decoded with, never under the current one
+        if self.save_thumbnails and imager.image_key is not None:
+            self.session.set_thumbnail(imager.image_key[0], imager.model_key_parameters(imager.image_key),
+                                       *thumbnail(imager.image_data))
+        elif not self.save_thumbnails:
+            self.session.thumbnails.clear()
+        try:
+            self.session.save(self.filename)
+        except IOError:
+            print("Cannot write the session of %s" % (self.filename))
+
+    def model_remember_image(self):
+        self.session.set_frame(self.offset, self.model_decode_parameters())
+        self.model_save_session()
 
     def model_init(self):
         self.audio_data = None
+        self.session = None
+        self.save_thumbnails = True
+        self.filename = None
+        self.frame_index = None
+        self.frame_index_parameters = None
         self.offset = 0
         self.scan_line_width = 3197
         self.number_of_scans = 512
@@ -546,27 +1286,120 @@ class VoyagerBrowser(object):
         self.plot_scanline = 0
         self.invert_signal = False
         self.flip_horizontal = False
+        self.channel = 0
+        self.align_mode = None
+        self.interpolation = "nearest"
+        self.frame_cache = FrameCache(256 * 2 ** 20)
+        self.replot_job = None
+        self.preview_job = None
+        self.replot_delay = 300
+        self.preview_delay = 50
+        self.live_preview = False
         self.offset_exceeded = False
+        self.profiler = Profiler.from_environment()
 
     def on_close(self):
+        self.model_save_session()
         print("Bye!")
         self.root.destroy()
         sys.exit(0)
 
+    def view_on_map(self, event):
+        if event.widget is self.root:
+            self.root.unbind("<Map>")
+            self.profiler.record("startup", time.perf_counter() - startup_time)
+            self.view_show_timings()
+
     def view_init(self, mpltlib3):
         self.root = tk.Tk()
+        self.worker = DecodeWorker(self.root)
+        # * the overview and the frame index of a long file take a while to build the
+        # * first time (a pass over the whole file), do not hold back decoding
+        self.overview_worker = DecodeWorker(self.root)
+        self.index_worker = DecodeWorker(self.root)
         self.workframe = tk.Frame(self.root)
         self.menu = FileMenu(self)
         self.imager = Imager(self, mpltlib3)
         self.controlwidgets = ControlWidgets(self)
+        self.statusbar = tk.Label(self.root, text="", anchor=tk.W, relief=tk.SUNKEN, borderwidth=1)
+        self.statusbar.pack(side=tk.BOTTOM, fill=tk.X)
         self.workframe.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         self.root.title("Voyager Audio Image Browser")
+        self.root.bind("<Map>", self.view_on_map)
+
+    def view_schedule_replot(self):
+        '''Replots once the parameters stop changing for `replot_delay` ms, coalescing rapid edits.'''
+        self.view_cancel_replot()
+        self.replot_job = self.root.after(self.replot_delay, self.view_replot_now)
+        if self.live_preview:
+            self.preview_job = self.root.after(self.preview_delay, self.view_preview_now)
+
+    def view_cancel_replot(self):
+        for job in (self.replot_job, self.preview_job):
+            if job is not None:
+                self.root.after_cancel(job)
+        self.replot_job = self.preview_job = None
+
+    def view_replot_now(self):
+        self.view_cancel_replot()
+        self.imager.view_plot_image()
+
+    def view_preview_now(self):
+        self.preview_job = None
+        self.imager.view_plot_preview()
+
+    def view_apply_parameters(self, parameters):
+        '''Sets the controls to the given (session) parameters, shows the thumbnail if any and replots.'''
+        controls = self.controlwidgets
+        if "scan_line_width" in parameters:
+            controls.scansize.scan_line_width_entry.textvariable.set(str(parameters["scan_line_width"]))
+        if "number_of_scans" in parameters:
+            controls.numberofscans.number_of_scans_entry.textvariable.set(str(parameters["number_of_scans"]))
+        if "adjust" in parameters:
+            controls.adjust.adjust_control_entry.textvariable.set(str(parameters["adjust"]))
+        if "offset" in parameters:
+            controls.offset.offset_entry.textvariable.set(str(parameters["offset"]))
+        if "invert_signal" in parameters:
+            self.menu.invert_signal.set(parameters["invert_signal"])
+        if "flip_horizontal" in parameters:
+            self.menu.flip_horizontal.set(parameters["flip_horizontal"])
+        if "channel" in parameters:
+            self.menu.channel.set(-1 if parameters["channel"] is None else parameters["channel"])
+        if "align_mode" in parameters:
+            self.menu.align_mode.set(parameters["align_mode"] or "")
+        if "interpolation" in parameters:
+            self.menu.interpolation.set(parameters["interpolation"])
+        if "plot_scanline" in parameters:
+            self.plot_scanline = parameters["plot_scanline"]
+            controls.scanlineplot.scale.set(self.plot_scanline)
+
+        # * the thumbnail stands in for the image until it is decoded
+        stored = self.session.get_thumbnail(self.offset, self.model_decode_parameters()) \
+            if self.session is not None else None
+        if stored is not None and self.frame_cache.get(self.imager.model_segment_key()) is None:
+            step, image = stored
+            self.imager.view_render((image.astype(np.float32), None, False), step)
+        self.view_replot_now()
+
+    def view_show_timings(self):
+        self.statusbar.config(text=self.profiler.summary("startup", "figure", "load", "decode", "render", "draw",
+                                                         "export", "search"))
 
     def view_nodata_error(self):
         print("No data in memory to plot yet!!")
         messagebox.showerror("Error", "No data in memory to plot yet!!")
 
+    def view_load_error(self, error):
+        self.root.config(cursor="")
+        print("Invalid wav file: %s" % (error))
+        messagebox.showerror("Error", "Invalid wav file\n%s" % (error))
+
+    def view_worker_error(self, error):
+        self.root.config(cursor="")
+        print("Error: %s" % (error))
+        messagebox.showerror("Error", str(error))
+
     def view_offset_exceeded_error(self):
         print("Cannot plot. End of data!!")
         messagebox.showerror("Error", "Cannot plot. End of data!!")
@@ -574,11 +1407,11 @@ class VoyagerBrowser(object):
     def view_mainloop(self):
         self.root.mainloop()
 
-    def __init__(self, mpltlib3=True):
+    def __init__(self, mpltlib3=None):
         self.model_init()
         self.view_init(mpltlib3)
         self.view_mainloop()
 
 
 if __name__ == "__main__":
-    VoyagerBrowser(mpltlib3)
+    VoyagerBrowser()
@@ -0,0 +1,170 @@
+"""
+** voyagerprofile.py - Timing and profiling of the stages of voyagerimb **
+
+Copyright (c) <2017> Manuel Arturo Izquierdo <aizquier@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import os
+import io
+import json
+import time
+import threading
+import tracemalloc
+import contextlib
+import collections
+
+# * e.g. VOYAGERIMB_PROFILE=cprofile,tracemalloc VOYAGERIMB_PROFILE_LOG=timings.jsonl
+PROFILE_ENVIRONMENT = "VOYAGERIMB_PROFILE"
+PROFILE_LOG_ENVIRONMENT = "VOYAGERIMB_PROFILE_LOG"
+
+
+class Profiler(object):
+    '''Times the stages (load, decode, render, export...) of the browser.
+
+    Every stage run is recorded as a dictionary with its name, duration and
+    the extra information given; the last `history` records are kept, and
+    are also appended as JSON lines to `log` if given. Optionally a stage is
+    run under cProfile, keeping its `top` slowest functions, and/or under
+    tracemalloc, keeping the peak memory allocated while it ran. Stages can
+    run on any thread.
+    '''
+
+    def __init__(self, cprofile=False, memory=False, log=None, history=1000, top=15):
+        self.cprofile = cprofile
+        self.memory = memory
+        self.log = log
+        self.top = top
+        self.records = collections.deque(maxlen=history)
+        self.lock = threading.Lock()
+        # * only one cProfile profiler can be active at a time
+        self.cprofile_lock = threading.Lock()
+
+    @classmethod
+    def from_environment(cls, environment=os.environ):
+        options = [option.strip().lower() for option in environment.get(PROFILE_ENVIRONMENT, "").split(",")]
+        return cls(cprofile="cprofile" in options, memory="tracemalloc" in options,
+                   log=environment.get(PROFILE_LOG_ENVIRONMENT) or None)
+
+    def set_memory(self, memory):
+        self.memory = memory
+        if not memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextlib.contextmanager
+    def stage(self, name, **info):
+        record = dict(stage=name, time=time.time(), thread=threading.current_thread().name, **info)
+        profile = None
+        if self.cprofile and self.cprofile_lock.acquire(False):
+            import cProfile
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # * another profiling tool is active
+                self.cprofile_lock.release()
+                profile = None
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            # * the peak is global to the process, so stages running at the same time share it
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            if self.memory and tracemalloc.is_tracing():
+                record["peak_mb"] = tracemalloc.get_traced_memory()[1] / 1e6
+            if profile is not None:
+                profile.disable()
+                self.cprofile_lock.release()
+                record["functions"] = self.model_top_functions(profile)
+            self.model_add(record)
+
+    def wrap(self, name, function, **info):
+        '''Returns `function` timed as the stage `name`, to submit it to a worker.'''
+        def timed(*args, **kwargs):
+            with self.stage(name, **info):
+                return function(*args, **kwargs)
+        return timed
+
+    def model_top_functions(self, profile):
+        import pstats
+        try:
+            stats = pstats.Stats(profile, stream=io.StringIO()).stats
+        except TypeError:
+            # * nothing was profiled
+            return []
+        rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:self.top]
+        return [{"function": "%s:%d(%s)" % function, "calls": calls, "total_s": total, "cumulative_s": cumulative}
+                for function, (_, calls, total, cumulative, _) in rows]
+
+    def record(self, name, seconds, **info):
+        '''Records a stage timed elsewhere.'''
+        self.model_add(dict(stage=name, time=time.time(), seconds=seconds, **info))
+
+    def model_add(self, record):
+        with self.lock:
+            self.records.append(record)
+            if self.log is not None:
+                try:
+                    with open(self.log, "a") as f:
+                        f.write(json.dumps(record) + "\n")
+                except IOError:
+                    print("Cannot write the profile log %s" % (self.log))
+                    self.log = None
+
+    def last(self, *names):
+        '''Last record of each of the stages `names` (all of them if none given), by name.'''
+        latest = collections.OrderedDict()
+        with self.lock:
+            for record in self.records:
+                if not names or record["stage"] in names:
+                    latest[record["stage"]] = record
+        return latest
+
+    def summary(self, *names):
+        '''One line with the last duration of the stages, e.g. "decode 0.031 s | draw 0.240 s".'''
+        parts = []
+        latest = self.last(*names)
+        for name in names or list(latest):
+            if name not in latest:
+                continue
+            record = latest[name]
+            part = "%s %.3f s" % (name, record["seconds"])
+            if "peak_mb" in record:
+                part += " (%.1f MB)" % (record["peak_mb"])
+            parts.append(part)
+        return " | ".join(parts)
+
+    def export(self, filename):
+        '''Writes every record kept as JSON lines, returns the number of records.'''
+        with self.lock:
+            records = list(self.records)
+        with open(filename, "w") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        return len(records)
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()